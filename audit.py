@@ -0,0 +1,111 @@
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import metrics
+import storage
+import write_behind
+
+
+PAGE_SIZE = 50
+# changes older than this many days are rolled up into monthly counts per
+# event, modifier and type. Off by default: rolling up drops the modifier
+# and new date of each change, so it has to be asked for
+RETENTION_DAYS = int(os.environ.get('FACILITY_LOG_RETENTION_DAYS', '0'))
+# a failed retention run is tried again on a rerun after this many seconds
+RETENTION_RETRY = 600
+MODIFICATION_TYPES = ['update Expected repair Date', 'update Actual Repair Date']
+TIMELINE_COLUMNS = ['modification Date', 'modifier name', 'modification type', 'new Date', 'changes']
+_retained = False
+_retry_at = 0
+
+
+def timeline(event_id):
+    # one event's history, oldest first. Rolled-up months come back as one
+    # row each, dated by their last change and counting the changes in it
+    changes, _ = storage.query('change_log', where={'event id': event_id}, order_by='modification Date')
+    rolled, _ = storage.query('change_log_rollup', where={'event id': event_id}, order_by='month')
+    changes = changes.assign(changes=1)
+    rolled = rolled.rename(columns={'last modification Date': 'modification Date', 'last new Date': 'new Date'})
+    frames = [df.reindex(columns=TIMELINE_COLUMNS) for df in (rolled, changes) if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=TIMELINE_COLUMNS)
+    return pd.concat(frames, ignore_index=True).astype({'modifier name': object, 'modification type': object})
+
+
+def _filters(event_id=None, modifiers=(), types=(), start=None, end=None):
+    where = {}
+    if event_id:
+        where['event id'] = event_id
+    if modifiers:
+        where['modifier name'] = list(modifiers)
+    if types:
+        where['modification type'] = list(types)
+    between = None
+    if start is not None or end is not None:
+        # end is a day picked in the UI, so the whole day is included
+        between = ('modification Date', start, None if end is None else pd.Timestamp(end) + pd.Timedelta(days=1))
+    return where, between
+
+
+def search(event_id=None, modifiers=(), types=(), start=None, end=None, page=1, page_size=PAGE_SIZE):
+    # (rows, total) of the filtered log, newest first; page_size=None
+    # returns every match
+    where, between = _filters(event_id, modifiers, types, start, end)
+    offset = (page - 1) * page_size if page_size else 0
+    return storage.query('change_log', where, between, order_by='modification Date', descending=True,
+                         limit=page_size, offset=offset)
+
+
+def rollup(rows):
+    # monthly change counts per event, modifier and type
+    month = pd.to_datetime(rows['modification Date']).dt.strftime('%Y-%m')
+    keys = [month.rename('month'), rows['event id'], rows['modifier name'], rows['modification type']]
+    grouped = rows.groupby(keys, observed=True, dropna=False, sort=True)
+    return pd.DataFrame({
+        'changes': grouped.size(),
+        'last modification Date': grouped['modification Date'].max(),
+        'last new Date': grouped['new Date'].max(),
+    }).reset_index()
+
+
+def apply_retention(today=None, days=None):
+    # changes from months entirely older than the retention window move into
+    # the rollup store in one transaction
+    days = RETENTION_DAYS if days is None else days
+    if not days:
+        return 0
+    cutoff = (pd.Timestamp(today or datetime.now()) - pd.Timedelta(days=days)).to_period('M').to_timestamp()
+    old, total = storage.query('change_log', between=('modification Date', None, cutoff), limit=1)
+    if not total:
+        return 0
+    old, _ = storage.query('change_log', between=('modification Date', None, cutoff))
+    storage.apply([
+        ('append', 'change_log_rollup', rollup(old)),
+        ('prune', 'change_log', 'modification Date', cutoff),
+    ])
+    return len(old)
+
+
+def _run_retention():
+    # no session waits on this job, so a failure is logged here and the run
+    # is allowed again after RETENTION_RETRY
+    global _retained, _retry_at
+    try:
+        return apply_retention()
+    except Exception:
+        metrics.logger.exception('Change log retention failed; retrying in %s s', RETENTION_RETRY)
+        _retry_at = time.time() + RETENTION_RETRY
+        _retained = False
+        raise
+
+
+def schedule_retention():
+    # once per process and on the write-behind worker, never on a rerun
+    global _retained
+    if _retained or not RETENTION_DAYS or time.time() < _retry_at:
+        return None
+    _retained = True
+    return write_behind.get_queue().task(_run_retention, 'Change log retention')
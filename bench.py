@@ -0,0 +1,176 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from datetime import date
+
+import numpy as np
+
+import storage
+import export
+import lifecycle
+import shared
+import synthetic
+from catalog import checklist_items, locations, repair_personnel
+
+
+SIZES = [1000, 10000, 100000]
+REPEAT = 3
+# a run this much slower than the baseline is flagged
+REGRESSION = 1.25
+
+
+def _walk_entries(rng):
+    # one location walk: most categories pass, a few become work orders
+    entries = []
+    for category in checklist_items:
+        rating = int(rng.choice([0, 0, 0, 1, 2, 3]))
+        entries.append({
+            'Element': category,
+            'Rating': rating,
+            'comment': '' if rating == 0 else checklist_items[category][0],
+            'responsible person': '' if rating == 0 else repair_personnel[0],
+            'Safety related': False,
+            'Quality related': False,
+            'image': None})
+    return entries
+
+
+def operations(data, rng):
+    # (name, function) pairs for the paths facility_w.py drives, called the
+    # way the page calls them: a cold load drops the cached copy first
+    orders = data['work_orders']
+    open_ids = iter(orders['event id'].iloc[::-1].tolist())
+    new_row = orders.iloc[[0]].copy()
+    months = storage.partitions('completed')
+    table = shared.SharedTable('work_orders')
+
+    def cold(store, partition=None):
+        storage.invalidate(store)
+        return storage.read_store(store, partition)
+
+    def indexed_search(query):
+        df, _ = table.snapshot()
+        return table.search(df, query, 'All Columns')
+
+    # one-time costs a running app has already paid: the search index and
+    # the scan that seeds the event id sequence
+    indexed_search('')
+    storage.next_event_ids()
+    return [
+        ('load work_orders', lambda: cold('work_orders')),
+        ('load checklist', lambda: cold('checklist')),
+        ('load change_log', lambda: cold('change_log')),
+        ('completed month', lambda: cold('completed', months[-1] if months else None)),
+        ('shared snapshot', lambda: shared.SharedTable('work_orders').snapshot()),
+        # a fresh table has no index yet, so this is the first search of a process
+        ('search index build', lambda: shared.SharedTable('work_orders').search(orders, 'processing', 'All Columns')),
+        ('search indexed', lambda: indexed_search('location:warehouse AND doors')),
+        ('get_next_event_id', lambda: storage.next_event_ids()[0]),
+        ('add row', lambda: storage.append_rows('work_orders', new_row)),
+        ('location walk', lambda: storage.apply(
+            lifecycle.record_walk(str(rng.choice(locations)), synthetic.DETECTORS[0], _walk_entries(rng))[0])),
+        ('complete order', lambda: storage.apply(lifecycle.complete(next(open_ids), date.today(), repair_personnel[0]))),
+        ('export xlsx', lambda: export.to_bytes(orders, 'xlsx')),
+        ('export csv', lambda: export.to_bytes(orders, 'csv')),
+        ('replace store', lambda: storage.replace_store('checklist', data['checklist'])),
+    ]
+
+
+def measure(fn, repeat, memory=True):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        # a separate call: tracing slows allocation-heavy code down
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'median ms': statistics.median(times) * 1000, 'min ms': min(times) * 1000,
+            'peak MB': peak / 2 ** 20 if peak is not None else None}
+
+
+def run_size(rows, repeat, memory=True, only=None, seed=0):
+    # each size gets its own store files and snapshots in a scratch directory
+    cwd = os.getcwd()
+    snapshot_dir = shared.SNAPSHOT_DIR
+    scratch = tempfile.mkdtemp(prefix=f'facility-bench-{rows}-')
+    results = []
+    try:
+        os.chdir(scratch)
+        shared.SNAPSHOT_DIR = os.path.join(scratch, 'snapshots')
+        storage.set_backend(storage.BACKENDS[os.environ.get('FACILITY_STORAGE', 'sqlite')]())
+        data = synthetic.history(rows, seed)
+        for store, df in data.items():
+            start = time.perf_counter()
+            storage.replace_store(store, df)
+            results.append({'rows': rows, 'operation': f'seed {store}',
+                            'median ms': (time.perf_counter() - start) * 1000, 'min ms': None, 'peak MB': None})
+        for name, fn in operations(data, np.random.default_rng(seed)):
+            if only and name not in only:
+                continue
+            results.append({'rows': rows, 'operation': name, **measure(fn, repeat, memory)})
+            print(_line(results[-1]), file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        shared.SNAPSHOT_DIR = snapshot_dir
+        storage.set_backend(None)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def _line(result, baseline=None):
+    peak = f'{result["peak MB"]:9.1f}' if result['peak MB'] is not None else ' ' * 9
+    line = f'{result["rows"]:>9} {result["operation"]:<22} {result["median ms"]:11.1f} {peak}'
+    if baseline:
+        ratio = result['median ms'] / baseline['median ms'] if baseline['median ms'] else float('inf')
+        line += f' {ratio:7.2f}x' + ('  SLOWER' if ratio > REGRESSION else '')
+    return line
+
+
+def report(results, baseline=None, out=sys.stdout):
+    known = {(r['rows'], r['operation']): r for r in baseline or []}
+    header = f'{"rows":>9} {"operation":<22} {"median ms":>11} {"peak MB":>9}'
+    print(header + (' baseline' if baseline else ''), file=out)
+    for result in results:
+        print(_line(result, known.get((result['rows'], result['operation']))), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the load, search, write and export paths on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='rows per store, e.g. 1000 10000 1000000')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--only', nargs='+', help='operation names to run')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures peak memory')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file from an earlier --save to compare against')
+    args = parser.parse_args(argv)
+    results = []
+    for rows in args.sizes:
+        results += run_size(rows, args.repeat, not args.no_memory, args.only)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
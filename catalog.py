@@ -0,0 +1,56 @@
+# what a location walk covers and who can be assigned a repair
+
+checklist_items = {
+    "Floors": [
+        "Inspect floors for visible damage and stains"
+    ],
+    "Lights": [
+        "Ensure all light fixtures are operational."
+    ],
+    "Electrical Outlets": [
+        "Inspect all electrical outlets for visible damage",
+        "Ensure all outlet covers are installed properly and not damaged.",
+        "Verify all electrical outlets are labeled"
+    ],
+    "Doors": [
+        "Inspect door for visible damage and paint chipping",
+        "Check door hardware for proper operation (badge access, door handles)",
+        "Ensure doors close and latch properly",
+        "Inspect door seals"
+    ],
+    "Ceilings": [
+        "Inspect ceilings for visible damage (including cracks, dings, dents, holes) and paint chipping",
+        "Inspect ceiling penetrations around piping and ducting to ensure seals fully cover any gaps",
+        "Sealing material is not dry or cracked"
+    ],
+    "Walls": [
+        "Inspect walls for visible damage (including cracks, dings, dents, holes) and paint chipping",
+        "Inspect all wall penetrations around piping to ensure seals fully cover any gaps and holes",
+        "Sealing material is not dry or cracked."
+    ],
+    "Windows": [
+        "Inspect windows for visible damage and cracks",
+        "Inspect exterior window seals for cracking, holes, and gaps",
+        "Inspect curtains for visible damage and standardize"
+    ],
+    "Visuals": [
+        "Inspect visuals for visible damage or fading",
+        "Ensure visuals are updated"
+    ],
+    "Fixtures and fittings": [
+        "Inspect fixtures such as faucets, WC bowls, bathroom sinks, mirrors, etc.",
+        "Inspect cafeteria & coffee corner fittings (coffee machines, kettles, Bain Marie, etc.)",
+        "Inspect fixture and fitting condition for visible damage"
+    ],
+    "Furniture": [
+        "Inspect movable office furniture, desks, chairs, sofas, tables, cabinets, etc.",
+        "Inspect furniture condition for visible damage"
+    ]
+}
+
+locations = ['Admin indoor', 'QC lab & Sampling room', 'Processing', 'Receiving area & Reject room',
+             'Technical corridor', 'Packaging', 'Warehouse', 'Utilities & Area Surround',
+             'Outdoor & security gates', 'Electric rooms', 'Waste WTP & Incinerator',
+             'Service Building & Garden Store', 'Pumps & Gas Rooms']
+
+repair_personnel = ['shehab', 'sameh', 'kaleed', 'yasser', 'masry',"zeinab",'wael']
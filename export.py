@@ -0,0 +1,117 @@
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+
+MIME = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+# total size of the cached exports; the least recently used go first
+CACHE_BYTES = 64 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_size = 0
+_cache_lock = threading.Lock()
+
+
+def available_formats():
+    formats = ['xlsx', 'csv']
+    try:
+        import pyarrow  # noqa: F401
+        formats.append('parquet')
+    except ImportError:
+        pass
+    return formats
+
+
+def file_name(name, fmt):
+    return f'{name.rsplit(".", 1)[0]}.{fmt}'
+
+
+def strip_timezones(df):
+    # vectorized and on a copy: the session frame is left untouched
+    tz_columns = df.select_dtypes(include=['datetimetz']).columns
+    if len(tz_columns) == 0:
+        return df
+    return df.assign(**{col: df[col].dt.tz_localize(None) for col in tz_columns})
+
+
+def _xlsx_values(series):
+    # column-wise conversion to plain python values, blanks as None
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = list(series.dt.to_pydatetime())
+    else:
+        values = series.tolist()
+    missing = series.isna().to_numpy()
+    if missing.any():
+        for i in np.flatnonzero(missing):
+            values[i] = None
+    return values
+
+
+def write_xlsx(df, target):
+    # rows are streamed one at a time in constant-memory mode, so memory does
+    # not grow with the table the way a pandas ExcelWriter workbook does
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'remove_timezone': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    sheet = workbook.add_worksheet('Sheet1')
+    sheet.write_row(0, 0, [str(c) for c in df.columns], workbook.add_format({'bold': True, 'border': 1}))
+    columns = [_xlsx_values(df[col]) for col in df.columns]
+    for r, row in enumerate(zip(*columns), 1):
+        sheet.write_row(r, 0, row)
+    workbook.close()
+
+
+def to_bytes(df, fmt='xlsx'):
+    df = strip_timezones(df)
+    output = io.BytesIO()
+    if fmt == 'xlsx':
+        write_xlsx(df, output)
+    elif fmt == 'csv':
+        df.to_csv(output, index=False, chunksize=50000)
+    elif fmt == 'parquet':
+        df.astype({c: str for c in df.select_dtypes(include='object').columns}).to_parquet(output, index=False)
+    else:
+        raise ValueError(f'Unknown export format: {fmt}')
+    return output.getvalue()
+
+
+def export_bytes(name, version, df, fmt='xlsx'):
+    # one serialization per (table, data version, format) for all sessions;
+    # df may be a function returning the frame, called only on a cache miss
+    global _cache_size
+    key = (name, version, fmt)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    if callable(df):
+        df = df()
+    with metrics.span('export', table=name, format=fmt, rows=len(df)):
+        data = to_bytes(df, fmt)
+    metrics.count('bytes exported', len(data))
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = data
+            _cache_size += len(data)
+        while _cache_size > CACHE_BYTES and len(_cache) > 1:
+            _, dropped = _cache.popitem(last=False)
+            _cache_size -= len(dropped)
+    return data
+
+
+def lazy(name, version, df, fmt='xlsx'):
+    # for st.download_button(data=...): nothing is built until the click
+    return lambda: export_bytes(name, version, df, fmt)
@@ -2,11 +2,18 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
-from PIL import Image
 import pytz
-import io
-from io import BytesIO
-import time
+import storage
+import export
+import images
+import write_behind
+import lifecycle
+import kpis
+import shared
+import metrics
+import audit
+from table_view import paged_table
+from catalog import checklist_items, locations, repair_personnel
 
 st.set_page_config(
     layout="wide",
@@ -16,170 +23,164 @@ st.set_page_config(
 egypt_tz = pytz.timezone('Africa/Cairo')
 
 
+def export_button(label, name, version, df, file_name, **kwargs):
+    # bytes are built only when clicked and cached per data version
+    fmt = st.session_state.get('export_format', 'xlsx')
+    st.download_button(
+        label=label,
+        data=export.lazy(name, version, df, fmt),
+        file_name=export.file_name(file_name, fmt),
+        mime=export.MIME[fmt],
+        **kwargs)
 
-def load_checklist_data():
-    if os.path.exists('work_order_records.xlsx'):
-        df = pd.read_excel('work_order_records.xlsx', sheet_name='Sheet1', engine='openpyxl')
-        for col in ['Date', 'Expected repair Date', 'Actual Repair Date']:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce').dt.tz_localize(None)
-        return df
-    return pd.DataFrame(columns=[
-        'event id', 'location', 'Element', 'Event Detector Name', 
-        'Date', 'Rating', 'responsible person', 
-        'Expected repair Date', 'Actual Repair Date', 'image path', 'comment','Safety related','Quality related'])
-
-def checklist_data():
-    if os.path.exists('checklist.xlsx'):
-        return pd.read_excel('checklist.xlsx', engine='openpyxl')
-    return pd.DataFrame(columns=[
-        'event id', 'location', 'Element', 
-        'Event Detector Name', 'Date', 'Rating', 'comment'])
-    
-def load_completed_work_orders():
-    if os.path.exists('completed_work_order.xlsx'):
-        return pd.read_excel('completed_work_order.xlsx', engine='openpyxl')
-    return pd.DataFrame(columns=[
-        'event id', 'location', 'Element', 'Event Detector Name', 
-        'Date', 'Rating', 'responsible person', 
-        'Expected repair Date', 'Actual Repair Date', 'image path', 'comment','Safety related','Quality related'])
-    
-def load_change_log():
-    if os.path.exists('change_log.xlsx'):
-        return pd.read_excel('change_log.xlsx', engine='openpyxl')
-    return pd.DataFrame(columns=[
-        'event id', 'modifier name', 'modification Date', 
-        'modification type', 'new Date'
-    ])
-def to_excel(df):
-    for col in df.select_dtypes(include=['datetime64[ns, UTC]', 'datetime64[ns]']):
-        df[col] = df[col].apply(lambda x: x.tz_localize(None) if x.tzinfo else x)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-    return output.getvalue()
-
-
-def save_checklist(df):
-    try:
-        df.to_excel('checklist.xlsx', index=False, engine='openpyxl')
-        st.success(f"checklist recorded successfully: {category}!")
-    except Exception as e:
-        st.error(f"An error occurred while saving the data: {str(e)}")
-
-
-def save_checklist_data(df):
-    try:
-        df.to_excel('work_order_records.xlsx', index=False, engine='openpyxl')
-        st.success(f"work order recorded successfully: {category}!")
-    except Exception as e:
-        st.error(f"An error occurred while saving the data: {str(e)}")
-
-def save_completed_work_orders(df):
-    try:
-        df.to_excel('completed_work_order.xlsx', index=False, engine='openpyxl')
-        st.success("Completed work orders saved successfully!")
-    except Exception as e:
-        st.error(f"An error occurred while saving the data: {str(e)}")
-
-
-def save_change_log(df):
-    try:
-        df.to_excel('change_log.xlsx', index=False, engine='openpyxl')
-        st.success("Data saved successfully!")
-    except Exception as e:
-        st.error(f"An error occurred while saving the data: {str(e)}")
-
-
-
-
-
-checklist_items = {
-    "Floors": [
-        "Inspect floors for visible damage and stains"
-    ],
-    "Lights": [
-        "Ensure all light fixtures are operational."
-    ],
-    "Electrical Outlets": [
-        "Inspect all electrical outlets for visible damage",
-        "Ensure all outlet covers are installed properly and not damaged.",
-        "Verify all electrical outlets are labeled"
-    ],
-    "Doors": [
-        "Inspect door for visible damage and paint chipping",
-        "Check door hardware for proper operation (badge access, door handles)",
-        "Ensure doors close and latch properly",
-        "Inspect door seals"
-    ],
-    "Ceilings": [
-        "Inspect ceilings for visible damage (including cracks, dings, dents, holes) and paint chipping",
-        "Inspect ceiling penetrations around piping and ducting to ensure seals fully cover any gaps",
-        "Sealing material is not dry or cracked"
-    ],
-    "Walls": [
-        "Inspect walls for visible damage (including cracks, dings, dents, holes) and paint chipping",
-        "Inspect all wall penetrations around piping to ensure seals fully cover any gaps and holes",
-        "Sealing material is not dry or cracked."
-    ],
-    "Windows": [
-        "Inspect windows for visible damage and cracks",
-        "Inspect exterior window seals for cracking, holes, and gaps",
-        "Inspect curtains for visible damage and standardize"
-    ],
-    "Visuals": [
-        "Inspect visuals for visible damage or fading",
-        "Ensure visuals are updated"
-    ],
-    "Fixtures and fittings": [
-        "Inspect fixtures such as faucets, WC bowls, bathroom sinks, mirrors, etc.",
-        "Inspect cafeteria & coffee corner fittings (coffee machines, kettles, Bain Marie, etc.)",
-        "Inspect fixture and fitting condition for visible damage"
-    ],
-    "Furniture": [
-        "Inspect movable office furniture, desks, chairs, sofas, tables, cabinets, etc.",
-        "Inspect furniture condition for visible damage"
-    ]
-}
 
-repair_personnel = ['shehab', 'sameh', 'kaleed', 'yasser', 'masry',"zeinab",'wael']
+def download_button(label, session_key, file_name, **kwargs):
+    store = session_stores[session_key]
+    export_button(label, store, st.session_state.store_versions[store], st.session_state[session_key], file_name, **kwargs)
 
 
-def get_next_event_id():
-    if st.session_state.work_order_df.empty or 'event id' not in st.session_state.work_order_df.columns:
-        return 'Work Order 1'
+def append_checklist(rows):
+    queue_write(write_behind.get_queue().append('checklist', rows, f"checklist recorded successfully: {category}!"), 'df')
+
+
+def append_checklist_data(rows):
+    queue_write(write_behind.get_queue().append('work_orders', rows, f"work order recorded successfully: {category}!"), 'work_order_df')
+
+
+def show_ticket(ticket):
+    if ticket.error:
+        st.error(f"An error occurred while saving the data: {ticket.error}")
+    elif ticket.message:
+        st.success(ticket.message)
+
+
+def queue_write(ticket, *keys):
+    # with write-behind disabled the job has already run, so report it and
+    # refresh the session copy straight away
+    if ticket.done:
+        show_ticket(ticket)
+        if keys:
+            sync_session_data(*keys)
+    else:
+        st.session_state.setdefault('write_tickets', []).append(ticket)
 
-    event_ids = st.session_state.work_order_df['event id'].dropna().tolist()
 
-    if not event_ids:
-        return 'Work Order 1'
+@st.fragment(run_every=1)
+def write_status_panel():
+    # polls until a queued write lands, then reruns the page to show it
+    tickets = st.session_state.get('write_tickets', [])
+    if any(ticket.done for ticket in tickets):
+        st.rerun()
+    st.caption(f"Saving {len(tickets)} change(s) in the background...")
 
-    try:
-        last_id = event_ids[-1]
-        if isinstance(last_id, str):
-            last_num = int(last_id.split(' ')[-1])
+
+def report_write_status():
+    pending = []
+    for ticket in st.session_state.get('write_tickets', []):
+        if ticket.done:
+            show_ticket(ticket)
         else:
-            last_num = 0
-    except (ValueError, IndexError):
-        last_num = 0
+            pending.append(ticket)
+    st.session_state.write_tickets = pending
+    if pending:
+        write_status_panel()
+
+
+def metrics_panel(run):
+    # admin view, shown with FACILITY_METRICS=1: where this rerun's time went
+    history = st.session_state.setdefault('metrics_history', [])
+    history.append(run.elapsed * 1000)
+    del history[:-50]
+    with st.sidebar.expander('Performance'):
+        st.metric('This rerun', f"{run.elapsed * 1000:.0f} ms")
+        spans = pd.DataFrame([{'operation': name, 'calls': calls, 'ms': round(seconds * 1000, 1)}
+                              for name, (calls, seconds) in run.spans.items()])
+        if not spans.empty:
+            st.dataframe(spans.sort_values('ms', ascending=False), hide_index=True)
+        for name, value in run.counters.items():
+            st.caption(f"{name}: {value:,}")
+        st.caption('Recent reruns (ms)')
+        st.line_chart(pd.Series(history, name='ms'))
+        st.download_button('Download metrics log', metrics.export_log, file_name='metrics.jsonl',
+                           mime='application/x-ndjson')
+
+
+def get_next_event_id():
+    return storage.next_event_ids()[0]
+
+session_stores = {
+    'work_order_df': 'work_orders',
+    'df': 'checklist',
+}
+
+page_stores = {
+    'Event Logging': ['df', 'work_order_df'],
+    'Work Shop Order': ['work_order_df'],
+    # queried page by page, never loaded whole
+    'View Change Log': [],
+    'Dashboard': [],
+}
 
-    next_num = last_num + 1
-    return f'Work Order {next_num}'
-if 'work_order_df' not in st.session_state:
-    st.session_state.work_order_df = load_checklist_data()
-if 'completed' not in st.session_state:
-    st.session_state.completed = load_completed_work_orders()
-if 'df' not in st.session_state:
-    st.session_state.df = checklist_data()
-if 'log_df' not in st.session_state:
-    st.session_state.log_df = load_change_log()
 
+def sync_session_data(*keys):
+    # sessions hold the process-wide frame of the latest version, not a copy
+    versions = st.session_state.setdefault('store_versions', {})
+    for key in keys:
+        store = session_stores[key]
+        st.session_state[key], versions[store] = shared.snapshot(store)
 
-page = st.sidebar.radio('Select page', ['Event Logging', 'Work Shop Order', 'View Change Log'])
+
+def walk_form(selected_location):
+    # every category of one location in a single form: one rerun and one
+    # transaction for the whole walk
+    with st.form(f"walk_{selected_location}"):
+        detector_name = st.text_input('Detector Name', key=f"walk_detector_{selected_location}")
+        entries = []
+        for category, items in checklist_items.items():
+            st.markdown(f"<h3 style='color:green; font-size:30px;'>{category}.</h3>", unsafe_allow_html=True)
+            for item in items:
+                st.markdown(f"<span style='color:blue; font-size:18px;'>* {item}</span>", unsafe_allow_html=True)
+            col1a, col2a, col3a = st.columns([1, 2, 2])
+            rating = col1a.selectbox('Rating', [0, 1, 2, 3, 'N/A'], key=f"walk_rating_{category}_{selected_location}")
+            comment = col2a.text_input('Comment', key=f"walk_comment_{category}_{selected_location}")
+            responsible_person = col3a.selectbox('Responsible Person', [''] + repair_personnel, key=f"walk_person_{category}_{selected_location}")
+            col1b, col2b, col3b = st.columns([1, 1, 3])
+            risk_value = col1b.checkbox('Safety related?', key=f"walk_safety_{category}_{selected_location}")
+            quality_value = col2b.checkbox('Quality related?', key=f"walk_quality_{category}_{selected_location}")
+            uploaded_file = col3b.file_uploader(f"Upload Image ({category})", type=["jpg", "jpeg", "png"], key=f"walk_image_{category}_{selected_location}")
+            entries.append({
+                'Element': category,
+                'Rating': rating,
+                'comment': comment,
+                'responsible person': responsible_person,
+                'Safety related': risk_value,
+                'Quality related': quality_value,
+                'image': uploaded_file.getvalue() if uploaded_file is not None else None})
+        submitted = st.form_submit_button('Submit location')
+    if submitted:
+        errors = lifecycle.validate_walk(detector_name, entries)
+        for error in errors:
+            st.error(error)
+        if not errors:
+            ops, uploads = lifecycle.record_walk(selected_location, detector_name, entries)
+            queue_write(write_behind.get_queue().batch(
+                ops, f"{len(entries)} categories recorded successfully: {selected_location}!", uploads),
+                'df', 'work_order_df')
+
+
+metrics.begin_run()
+report_write_status()
+lifecycle.archive_done_orders()
+audit.schedule_retention()
+
+
+page = st.sidebar.radio('Select page', list(page_stores))
+st.sidebar.selectbox('Download format', export.available_formats(), key='export_format')
+# only the tables the page shows are brought up to date
+sync_session_data(*page_stores[page])
 
 
 if page == 'Event Logging':
-    work_order = load_checklist_data()
     col1, col2 = st.columns([2, 0.5])
     with col1:
         st.markdown("""
@@ -189,25 +190,21 @@ if page == 'Event Logging':
                 """, unsafe_allow_html=True)
     with col2:
         st.button("Update page",key='Update 2')
-        search_keyword = st.session_state.get('search_keyword', '')
-        search_keyword = st.text_input("Enter keyword to search:", search_keyword)
+        search_keyword = st.text_input("Enter keyword to search:", key='search_keyword',
+                                       help='Combine terms with AND / OR; use column:term to search one column, e.g. location:processing')
         search_button = st.button("Search")
         search_option = 'All Columns'    
     def search_in_dataframe(df_Material, keyword, option):
-        if option == 'All Columns':
-            result = df_Material[df_Material.apply(lambda row: row.astype(str).str.contains(keyword, case=False).any(), axis=1)]
-        else:
-            result = df_Material[df_Material[option].astype(str).str.contains(keyword, case=False)]
-        return result
-    if st.session_state.get('refreshed', False):
-        st.session_state.search_keyword = ''
-        st.session_state.refreshed = False
-    if search_button and search_keyword:
-        st.session_state.search_keyword = search_keyword
-        search_results = search_in_dataframe(st.session_state.work_order_df, search_keyword, search_option)
-        st.write(f"Search results for '{search_keyword}'in{search_option}:")
-        st.dataframe(search_results, width=1000, height=200)
-    st.session_state.refreshed = True
+        return shared.search('work_orders', df_Material, keyword, option)
+    if search_button:
+        # kept until the next search so the result pages can be turned;
+        # searching for nothing clears them
+        st.session_state.search_query = search_keyword
+    search_query = st.session_state.get('search_query')
+    if search_query:
+        search_results = search_in_dataframe(st.session_state.work_order_df, search_query, search_option)
+        st.write(f"Search results for '{search_query}'in{search_option}:")
+        paged_table(search_results, 'search_table', image_column='image path')
     
     
     image_save_path = 'uploaded_images'
@@ -215,10 +212,6 @@ if page == 'Event Logging':
     col1, col2 = st.columns([2, 6])
     with col1:
         st.markdown(f"<h3 style='color:black; font-size:30px;'>Select Location:</h3>", unsafe_allow_html=True)
-        locations = ['Admin indoor', 'QC lab & Sampling room', 'Processing', 'Receiving area & Reject room',
-                     'Technical corridor', 'Packaging', 'Warehouse', 'Utilities & Area Surround',
-                     'Outdoor & security gates', 'Electric rooms', 'Waste WTP & Incinerator',
-                     'Service Building & Garden Store', 'Pumps & Gas Rooms']
     
         selected_location = st.selectbox('Choose form these areas',locations)
         if selected_location:
@@ -231,76 +224,69 @@ if page == 'Event Logging':
     
     col1, col2 = st.columns([3,3])
     with col1:
-        for category, items in checklist_items.items():
-            st.markdown(f"<h3 style='color:green; font-size:30px;'>{category}.</h3>", unsafe_allow_html=True)
-            for item in items:
-                st.markdown(f"<span style='color:blue; font-size:18px;'>* {item}</span>", unsafe_allow_html=True)
+        batch_mode = st.toggle('Submit the whole location at once', value=True, key='batch_mode')
+        if batch_mode:
+            walk_form(selected_location)
+        else:
+            for category, items in checklist_items.items():
+                st.markdown(f"<h3 style='color:green; font-size:30px;'>{category}.</h3>", unsafe_allow_html=True)
+                for item in items:
+                    st.markdown(f"<span style='color:blue; font-size:18px;'>* {item}</span>", unsafe_allow_html=True)
                 
-            col1a, col2a, col3a, col4a = st.columns([1, 2, 2, 2])
-            Event_Detector_Name = col2a.text_input('Detector Name', key=f"detector_name_{category}_{selected_location}")
-            Rating = col1a.selectbox('Rating', [0, 1, 2, 3, 'N/A'], key=f"rating_{category}_{selected_location}")
-            comment = col3a.text_input('Comment', key=f"comment_{category}_{selected_location}")
-            responsible_person = col4a.selectbox('Responsible Person', [''] + repair_personnel, key=f"person_{category}_{selected_location}")
-            uploaded_file = st.file_uploader(f"Upload Image ({category})", type=["jpg", "jpeg", "png"], key=f"image_{category}_{selected_location}")
+                col1a, col2a, col3a, col4a = st.columns([1, 2, 2, 2])
+                Event_Detector_Name = col2a.text_input('Detector Name', key=f"detector_name_{category}_{selected_location}")
+                Rating = col1a.selectbox('Rating', [0, 1, 2, 3, 'N/A'], key=f"rating_{category}_{selected_location}")
+                comment = col3a.text_input('Comment', key=f"comment_{category}_{selected_location}")
+                responsible_person = col4a.selectbox('Responsible Person', [''] + repair_personnel, key=f"person_{category}_{selected_location}")
+                uploaded_file = st.file_uploader(f"Upload Image ({category})", type=["jpg", "jpeg", "png"], key=f"image_{category}_{selected_location}")
             
-            if Rating in [1, 2, 3]: 
-                st.markdown(f"<p style='color: red; font-size: 22px;'><b>Is this Safety related?</b></p>", unsafe_allow_html=True)
-                risk_value = st.checkbox('Safety related?', key=f'high_risk_checkbox_{category}_{selected_location}')
-                st.markdown(f"<p style='color: red; font-size: 22px;'><b>Is this Quality related?</b></p>", unsafe_allow_html=True)
-                Quality_value = st.checkbox('Quality related?', key=f'Quality_related_checkbox_{category}_{selected_location}')
-            else:
-                risk_value = None
-                Quality_value = None
-            button_key = f"add_{category}_{selected_location}"
-            if st.button(f'Add', key=button_key):
-                if Rating in [0, 'N/A']:
-                    event_id = 'check'
-                    new_check_row = {
-                        'event id': event_id,
-                        'location': selected_location,
-                        'Rating': Rating,
-                        'Element': category,
-                        'Event Detector Name': Event_Detector_Name,
-                        'Date': datetime.now(egypt_tz).replace(tzinfo=None),
-                        'comment': comment}
-                    new_check_df = pd.DataFrame([new_check_row])
-                    st.session_state.df = pd.concat([st.session_state.df, new_check_df], ignore_index=True)
-                    save_checklist(st.session_state.df)
+                if Rating in [1, 2, 3]: 
+                    st.markdown(f"<p style='color: red; font-size: 22px;'><b>Is this Safety related?</b></p>", unsafe_allow_html=True)
+                    risk_value = st.checkbox('Safety related?', key=f'high_risk_checkbox_{category}_{selected_location}')
+                    st.markdown(f"<p style='color: red; font-size: 22px;'><b>Is this Quality related?</b></p>", unsafe_allow_html=True)
+                    Quality_value = st.checkbox('Quality related?', key=f'Quality_related_checkbox_{category}_{selected_location}')
                 else:
-                    event_id = get_next_event_id()
-                    image_path = ""
-                    if uploaded_file is not None:
-                        try:
-                            image = Image.open(uploaded_file)
-                            if image.mode == "RGBA":
-                                image = image.convert("RGB")
-                            max_size = (800, 600)
-                            image.thumbnail(max_size)
-                            image_filename = os.path.join('uploaded_images', f"{event_id}.jpg")
-                            image.save(image_filename, optimize=True, quality=85)
-                            image_path = image_filename
-                            st.success(f"Image saved successfully as {uploaded_file.name}")
-                        except Exception as e:
-                            st.error(f"An error occurred while saving the image: {str(e)}")
-                            image_path = ""
-                    new_row = {
-                        'event id': event_id,
-                        'location': selected_location,
-                        'Element': category,
-                        'Event Detector Name': Event_Detector_Name,
-                        'Date': datetime.now(egypt_tz).replace(tzinfo=None),
-                        'Rating': Rating,
-                        'comment': comment,
-                        'responsible person': responsible_person,
-                        'Expected repair Date': '',
-                        'Actual Repair Date': '',
-                        'image path': image_path,
-                        'Safety related': 'Yes' if risk_value else 'No',
-                        'Quality related': 'Yes' if Quality_value else 'No'
-                    }
-                    new_row_df = pd.DataFrame([new_row])
-                    st.session_state.work_order_df = pd.concat([st.session_state.work_order_df, new_row_df], ignore_index=True)
-                    save_checklist_data(st.session_state.work_order_df)
+                    risk_value = None
+                    Quality_value = None
+                button_key = f"add_{category}_{selected_location}"
+                if st.button(f'Add', key=button_key):
+                    if Rating in [0, 'N/A']:
+                        event_id = 'check'
+                        new_check_row = {
+                            'event id': event_id,
+                            'location': selected_location,
+                            'Rating': Rating,
+                            'Element': category,
+                            'Event Detector Name': Event_Detector_Name,
+                            'Date': datetime.now(egypt_tz).replace(tzinfo=None),
+                            'comment': comment}
+                        new_check_df = pd.DataFrame([new_check_row])
+                        append_checklist(new_check_df)
+                    else:
+                        event_id = get_next_event_id()
+                        image_data = uploaded_file.getvalue() if uploaded_file is not None else None
+                        image_path = images.path_for_upload(image_data) if image_data else ""
+                        new_row = {
+                            'event id': event_id,
+                            'location': selected_location,
+                            'Element': category,
+                            'Event Detector Name': Event_Detector_Name,
+                            'Date': datetime.now(egypt_tz).replace(tzinfo=None),
+                            'Rating': Rating,
+                            'comment': comment,
+                            'responsible person': responsible_person,
+                            'Expected repair Date': '',
+                            'Actual Repair Date': '',
+                            'image path': image_path,
+                            'Safety related': 'Yes' if risk_value else 'No',
+                            'Quality related': 'Yes' if Quality_value else 'No'
+                        }
+                        new_row_df = pd.DataFrame([new_row])
+                        if image_data:
+                            # encoded by the worker ahead of the row; a failure clears 'image path'
+                            queue_write(write_behind.get_queue().image(
+                                image_data, new_row_df, f"Image saved successfully as {uploaded_file.name}"))
+                        append_checklist_data(new_row_df)
             
                                 
 
@@ -322,26 +308,22 @@ if page == 'Event Logging':
                     checklist record:
                 </h2>
                 """, unsafe_allow_html=True)
-        st.dataframe(st.session_state.df)
-        excel_data_checklist = to_excel(st.session_state.df)
-        st.download_button(
+        paged_table(st.session_state.df, 'checklist_table')
+        download_button(
             label="Download Checklist.",
-            data=excel_data_checklist,
+            session_key='df',
             file_name='checklist.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             key='download_checklist')
         st.markdown("""
             <h2 style='text-align: center; font-size: 30px; color: #A52A2A;'>
                 Facility Maintenance:
             </h2>
             """, unsafe_allow_html=True)
-        st.dataframe(st.session_state.work_order_df)
-        excel_data_work = to_excel(st.session_state.work_order_df)
-        st.download_button(
+        paged_table(st.session_state.work_order_df, 'work_order_table', image_column='image path')
+        download_button(
             label="Download work order.",
-            data=excel_data_work,
+            session_key='work_order_df',
             file_name='work_order_records.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             key='download_work_order_button')
         
         
@@ -373,38 +355,15 @@ if page == 'Work Shop Order':
                     update_end_button = st.button('Update Actual Repair Date')
                     if update_start_button:
                         if selected_event_id in st.session_state.work_order_df['event id'].values:
-                            st.session_state.work_order_df.loc[st.session_state.work_order_df['event id'] == selected_event_id, 'Expected repair Date'] = Expected_repair_Date.strftime('%Y-%m-%d')
-                            st.session_state.work_order_df.to_excel('work_order_records.xlsx', engine='openpyxl', index=False)
-                            st.success('Expected repair Date Updated successfully')
-                            new_log_entry = {
-                                'event id': selected_event_id,
-                                'modifier name': modifier_name,
-                                'modification Date': datetime.now(egypt_tz).replace(tzinfo=None),
-                                'modification type': 'update Expected repair Date',
-                                'new Date': Expected_repair_Date.strftime('%Y-%m-%d')
-                            }
-                            new_log_df = pd.DataFrame([new_log_entry])
-                            st.session_state.log_df = pd.concat([st.session_state.log_df, new_log_df], ignore_index=True)
-                            st.session_state.log_df.to_excel('change_log.xlsx', engine='openpyxl',  index=False)
+                            queue_write(write_behind.get_queue().batch(
+                                lifecycle.schedule(selected_event_id, Expected_repair_Date, modifier_name),
+                                'Expected repair Date Updated successfully'), 'work_order_df')
                     if update_end_button:
                         if selected_event_id in st.session_state.work_order_df['event id'].values:
-                            st.session_state.work_order_df.loc[st.session_state.work_order_df['event id'] == selected_event_id, 'Actual Repair Date'] = Actual_Repair_Date.strftime('%Y-%m-%d')
-                            st.session_state.work_order_df.loc[st.session_state.work_order_df['event id'] == selected_event_id, 'Status'] = 'Done'
-                            completed_order = st.session_state.work_order_df[st.session_state.work_order_df['event id'] == selected_event_id]
-                            completed_orders_df = pd.concat([load_completed_work_orders(), completed_order], ignore_index=True)
-                            save_completed_work_orders(completed_orders_df)
-                            st.session_state.work_order_df.to_excel('work_order_records.xlsx', index=False)
-                            st.success('Actual Repair Date Updated and status set to "Done"')
-                            new_log_entry = {
-                                'event id': selected_event_id,
-                                'modifier name': modifier_name,
-                                'modification Date': datetime.now(egypt_tz).replace(tzinfo=None),
-                                'modification type': 'update Actual Repair Date',
-                                'new Date': Actual_Repair_Date.strftime('%Y-%m-%d')
-                            }
-                            new_log_df = pd.DataFrame([new_log_entry])
-                            st.session_state.log_df = pd.concat([st.session_state.log_df, new_log_df], ignore_index=True)
-                            save_change_log(st.session_state.log_df) 
+                            # done orders leave the open table for the monthly archive
+                            queue_write(write_behind.get_queue().batch(
+                                lifecycle.complete(selected_event_id, Actual_Repair_Date, modifier_name),
+                                'Actual Repair Date Updated and status set to "Done"'), 'work_order_df')
             else:
                 st.warning("No events found for the selected person(s).")
         else:
@@ -417,9 +376,15 @@ if page == 'Work Shop Order':
             st.dataframe(selected_event)
             image_path = selected_event['image path'].values[0]
             if isinstance(image_path, str) and image_path and os.path.exists(image_path):
-                st.image(image_path, caption=f'Image for Event {selected_event["event id"].values[0]}', width=300)
+                st.image(images.load_full(image_path), caption=f'Image for Event {selected_event["event id"].values[0]}', width=300)
             else:
                 st.warning("Image not found or path is invalid.")
+            st.markdown("**History**")
+            history = audit.timeline(selected_event['event id'].values[0])
+            if history.empty:
+                st.caption("No changes recorded for this event yet.")
+            else:
+                st.dataframe(history, hide_index=True)
         else:
             st.warning("Select an event to view details.")
 
@@ -428,27 +393,80 @@ if page == 'Work Shop Order':
                 completed work order:
             </h2>
             """, unsafe_allow_html=True)
-        st.dataframe(st.session_state.completed)
-        excel_completed_work = to_excel(st.session_state.completed)
-        st.download_button(
-            label="Download completed work order.",
-            data=excel_completed_work,
-            file_name='completed_work_orders.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            key='download_work_completed_button'
-        )
+        months = storage.partitions('completed')
+        if months:
+            month = st.selectbox('Completed in', months, format_func=lambda m: m or 'No repair date', key='completed_month')
+            completed, completed_version = storage.read_store_versioned('completed', partition=month)
+            paged_table(completed, 'completed_table', image_column='image path')
+            export_button(
+                "Download completed work order.",
+                f'completed:{month}', completed_version, completed,
+                'completed_work_orders.xlsx',
+                key='download_work_completed_button')
+        else:
+            st.info("No completed work orders yet.")
     
 elif page == 'View Change Log':
     st.title('View Change Log')
-    change_log = load_change_log()
-    st.write(change_log)
-    excel_data = to_excel(st.session_state.log_df)
-    st.download_button(
-        label="Download Checklist as Excel",
-        data=excel_data,
-        file_name='change_log.xlsx',
-        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    # filtered and paged by indexed queries; only the visible page is read
+    col1, col2, col3, col4 = st.columns(4)
+    log_event_id = col1.text_input('Event ID', key='log_event_id').strip()
+    log_modifiers = col2.multiselect('Modifier name', repair_personnel, key='log_modifiers')
+    log_types = col3.multiselect('Modification type', audit.MODIFICATION_TYPES, key='log_types')
+    log_dates = col4.date_input('Modification Date', value=(), key='log_dates')
+    log_start, log_end = (tuple(log_dates) + (None, None))[:2]
+    log_filters = dict(event_id=log_event_id or None, modifiers=log_modifiers, types=log_types,
+                       start=log_start, end=log_end or log_start)
+    log_page = int(st.number_input('Page', min_value=1, value=1, step=1, key='log_page'))
+    log, log_total = audit.search(page=log_page, **log_filters)
+    log_pages = max(1, -(-log_total // audit.PAGE_SIZE))
+    if log_page > log_pages:
+        log_page = log_pages
+        log, log_total = audit.search(page=log_page, **log_filters)
+    with metrics.span('render', table='change_log', rows=len(log)):
+        st.dataframe(log, hide_index=True)
+    log_first = (log_page - 1) * audit.PAGE_SIZE
+    st.caption(f'Page {log_page} of {log_pages}: rows {log_first + 1 if log_total else 0}-{log_first + len(log)} of {log_total}')
+    export_button(
+        "Download Checklist as Excel",
+        f'change_log:{sorted(log_filters.items())}', storage.store_version('change_log'),
+        lambda: audit.search(page_size=None, **log_filters)[0],
+        'change_log.xlsx',
+        key='download_change_log_button')
+
+elif page == 'Dashboard':
+    st.title('Maintenance Dashboard')
+    # rollups shared by all sessions, caught up from the rows written since
+    # the last look
+    dashboard = kpis.get_dashboard()
+    today = datetime.now(egypt_tz).date()
+    summary = dashboard.summary(today)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric('Open work orders', summary['backlog'])
+    col2.metric('Overdue', summary['overdue'], help='Open orders past their Expected repair Date')
+    col3.metric('Mean time to repair', f"{summary['mttr']:.1f} days" if summary['mttr'] is not None else 'n/a')
+    col4.metric('Completed this month', summary['completed this month'])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        backlog_by = st.selectbox('Backlog by', ['location', 'Element', 'responsible person'])
+        st.bar_chart(dashboard.backlog(backlog_by))
+    with col2:
+        buckets, overdue, unscheduled = dashboard.aging(today)
+        st.markdown(f"**Open order age** ({unscheduled} without an expected repair date)")
+        st.bar_chart(buckets)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        trend_location = st.selectbox('Location', [''] + locations, format_func=lambda v: v or 'All locations')
+        trend_element = st.selectbox('Element', [''] + list(checklist_items), format_func=lambda v: v or 'All elements')
+        st.markdown("**Average rating per month**")
+        st.line_chart(dashboard.rating_trend(trend_location, trend_element))
+    with col2:
+        st.markdown("**Mean days to repair per month**")
+        st.line_chart(dashboard.repairs()['mean days'])
+        st.markdown("**Change log activity per month**")
+        st.bar_chart(dashboard.activity())
     
 
     
@@ -477,3 +495,8 @@ elif page == 'View Change Log':
         #])
         #st.session_state.log_df.to_excel('change_log.xlsx', index=False)
         #st.success('Log data cleared!')
+
+
+run = metrics.end_run(page)
+if run is not None:
+    metrics_panel(run)
@@ -0,0 +1,173 @@
+import io
+import os
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+IMAGE_DIR = 'uploaded_images'
+# content-addressed store: originals/<sha256>, full/<sha256>.jpg, preview/<sha256>.jpg
+STORE_DIR = os.path.join(IMAGE_DIR, 'store')
+VARIANTS = {
+    'full': (800, 600),
+    'preview': (160, 120),
+}
+CACHE_BYTES = 64 * 1024 * 1024
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def variant_path(digest, variant):
+    return os.path.join(STORE_DIR, variant, f"{digest}.jpg")
+
+
+def path_for_upload(data):
+    # known before the image is encoded, so the row can be queued right away
+    return variant_path(content_hash(data), 'full')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    metrics.count('bytes written', len(data))
+
+
+def _encode(image, max_size):
+    image = image.copy()
+    image.thumbnail(max_size)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', optimize=True, quality=85)
+    return output.getvalue()
+
+
+def _open(source):
+    # PIL is only loaded once an image is actually decoded
+    from PIL import Image
+
+    image = Image.open(source)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return image
+
+
+def store_upload(data):
+    # duplicate uploads hash to the same files and are stored once
+    digest = content_hash(data)
+    original = os.path.join(STORE_DIR, 'originals', digest)
+    if not os.path.exists(original):
+        _write_atomic(original, data)
+    missing = [v for v in VARIANTS if not os.path.exists(variant_path(digest, v))]
+    if missing:
+        with metrics.span('image encode', variants=len(missing), size=len(data)):
+            image = _open(io.BytesIO(data))
+            for variant in missing:
+                _write_atomic(variant_path(digest, variant), _encode(image, VARIANTS[variant]))
+    return variant_path(digest, 'full')
+
+
+def preview_path(image_path):
+    # stored uploads have a sibling preview; older per-event images get one
+    # keyed by their path
+    full_dir = os.path.normpath(os.path.join(STORE_DIR, 'full'))
+    if os.path.dirname(os.path.normpath(image_path)) == full_dir:
+        return variant_path(os.path.splitext(os.path.basename(image_path))[0], 'preview')
+    digest = hashlib.sha1(os.path.normpath(image_path).encode()).hexdigest()
+    return variant_path(f"legacy-{digest}", 'preview')
+
+
+class ByteCache:
+    # LRU of file contents bounded by total size, keyed by path and mtime
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        info = os.stat(path)
+        key = (path, info.st_mtime_ns, info.st_size)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        with open(path, 'rb') as f:
+            data = f.read()
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = data
+                self._size += len(data)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, dropped = self._items.popitem(last=False)
+                self._size -= len(dropped)
+        return data
+
+
+_cache = ByteCache()
+# (image path, mtime) of previews handed to the write-behind worker
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def _valid(image_path):
+    return isinstance(image_path, str) and image_path and os.path.exists(image_path)
+
+
+def load_full(image_path):
+    if not _valid(image_path):
+        return None
+    return _cache.read(image_path)
+
+
+def encode_preview(image_path):
+    with metrics.span('image encode', variants=1):
+        _write_atomic(preview_path(image_path), _encode(_open(image_path), VARIANTS['preview']))
+
+
+def _stale(path, image_path):
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(image_path)
+
+
+def _queue_preview(image_path):
+    # once per version of the image, so one that cannot be decoded is not
+    # retried on every rerun
+    key = (image_path, os.path.getmtime(image_path))
+    with _queued_lock:
+        if key in _queued:
+            return
+        _queued.add(key)
+    import write_behind
+
+    write_behind.get_queue().task(lambda: encode_preview(image_path))
+
+
+def load_preview(image_path):
+    # a missing or outdated preview is encoded on the write-behind worker;
+    # until then the image has no thumbnail
+    if not _valid(image_path):
+        return None
+    path = preview_path(image_path)
+    try:
+        if _stale(path, image_path):
+            # with write-behind off the task has already run
+            _queue_preview(image_path)
+            if _stale(path, image_path):
+                return None
+        return _cache.read(path)
+    except OSError:
+        return None
+
+
+def preview_data_uri(image_path):
+    data = load_preview(image_path)
+    if data is None:
+        return None
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode('ascii')
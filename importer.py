@@ -0,0 +1,182 @@
+import re
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import schema
+import storage
+from lifecycle import DONE
+
+
+CHUNK_ROWS = 50000
+# columns that identify a record regardless of its event id; an imported row
+# matching an existing one on all of them is skipped
+KEY_COLUMNS = ['location', 'Element', 'Event Detector Name', 'Date', 'Rating', 'comment']
+TRUE_VALUES = ('true', '1', 'yes', 'y')
+
+
+def _column_key(name):
+    return re.sub(r'[\s_]+', ' ', str(name)).strip().lower()
+
+
+def _chunks(header, rows, chunk_rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield pd.DataFrame(chunk, columns=header, dtype=object)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=header, dtype=object)
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    # frames of raw values; neither format is ever read whole
+    if path.lower().endswith('.csv'):
+        # only blank cells are missing, so an 'N/A' rating survives
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=object, keep_default_na=False, na_values=[''])
+        return
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is not None:
+            header = [str(c) if c is not None else f'column {i}' for i, c in enumerate(header)]
+            yield from _chunks(header, (r[:len(header)] for r in rows), chunk_rows)
+    finally:
+        workbook.close()
+
+
+def _dates(series):
+    # ISO text and real datetimes parse in one pass; anything else is retried
+    # with per-value format guessing
+    text = series.astype(object).where(series.astype(object) != '')
+    parsed = pd.to_datetime(text, errors='coerce', format='ISO8601')
+    retry = parsed.isna() & text.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(text[retry].astype(str), errors='coerce', format='mixed')
+    return parsed
+
+
+def normalize(chunk, store):
+    # rename loosely matching headers to the store's columns, drop the rest
+    # and blank rows, and type the values through schema. Work orders keep
+    # their Status, which decides whether they are open or completed
+    columns = list(storage.STORES[store]['columns'])
+    if store == 'work_orders':
+        columns.append('Status')
+    wanted = {_column_key(c): c for c in columns}
+    chunk = chunk.rename(columns=lambda c: wanted.get(_column_key(c), c))
+    chunk = chunk.loc[:, ~chunk.columns.duplicated()].reindex(columns=columns)
+    values = chunk.drop(columns=['event id', 'Status'], errors='ignore').astype(object)
+    chunk = chunk[~(values.isna() | (values == '')).all(axis=1)].reset_index(drop=True)
+    for col in chunk.columns:
+        if schema.COLUMN_TYPES.get(col) == 'datetime':
+            chunk[col] = _dates(chunk[col])
+    if chunk[schema.RATING_NA].notna().any():
+        chunk[schema.RATING_NA] = chunk[schema.RATING_NA].astype(str).str.strip().str.lower().isin(TRUE_VALUES)
+    if store == 'work_orders':
+        # imported orders always get fresh ids from the shared sequence
+        chunk['event id'] = None
+    else:
+        chunk['event id'] = 'check'
+    return schema.apply(chunk)
+
+
+def row_keys(df):
+    # one 64-bit hash per row over KEY_COLUMNS
+    keys = pd.DataFrame(index=df.index)
+    for col in KEY_COLUMNS:
+        series = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if schema.COLUMN_TYPES.get(col) == 'datetime':
+            keys[col] = pd.to_datetime(series, errors='coerce').to_numpy(dtype='datetime64[ns]').view('int64')
+        elif col == 'Rating':
+            keys[col] = pd.to_numeric(series, errors='coerce').astype(float)
+        else:
+            keys[col] = series.astype(object).where(series.notna(), '').astype(str).str.strip()
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def split_done(chunk):
+    # (store, rows) pairs: orders with a repair date or marked done are history
+    # and go to the completed archive, the rest are open
+    status = chunk['Status'].astype(object).where(chunk['Status'].notna(), '').astype(str).str.strip()
+    done = chunk['Actual Repair Date'].notna() | (status.str.lower() == DONE.lower())
+    chunk = chunk.drop(columns='Status')
+    completed = chunk[done].assign(Status=DONE)
+    return [('completed', completed), ('work_orders', chunk[~done])]
+
+
+def existing_keys(store):
+    keys = [row_keys(storage.load_store(store)[0])]
+    if store == 'work_orders':
+        # archived orders count too, or a re-import would reopen them
+        keys.append(row_keys(storage.load_store('completed')[0]))
+    return np.concatenate(keys)
+
+
+class Importer:
+    def __init__(self, store, chunk_rows=CHUNK_ROWS, out=sys.stdout):
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self.out = out
+        self.seen = existing_keys(store)
+        self.read = 0
+        self.added = 0
+        self.completed = 0
+        self.skipped = 0
+
+    def rows(self, paths):
+        # normalized, deduplicated (store, rows) pairs across all files, for append_stream
+        for path in paths:
+            read = added = completed = 0
+            for chunk in read_chunks(path, self.chunk_rows):
+                read += len(chunk)
+                chunk = normalize(chunk, self.store)
+                keys = row_keys(chunk)
+                new = ~(pd.Index(keys).isin(self.seen) | pd.Index(keys).duplicated())
+                self.seen = np.concatenate([self.seen, keys[new]])
+                added += int(new.sum())
+                if self.store == 'work_orders':
+                    for store, rows in split_done(chunk[new]):
+                        if store == 'completed':
+                            completed += len(rows)
+                        yield store, rows
+                else:
+                    yield self.store, chunk[new]
+            self.read += read
+            self.added += added
+            self.completed += completed
+            self.skipped += read - added
+            print(f'{path}: {read} rows read, {added} new'
+                  + (f', {completed} of them completed' if self.store == 'work_orders' else ''), file=self.out)
+
+    def run(self, paths, dry_run=False):
+        if dry_run:
+            for _ in self.rows(paths):
+                pass
+        else:
+            stores = ['work_orders', 'completed'] if self.store == 'work_orders' else [self.store]
+            storage.append_stream(stores, self.rows(paths), assign_ids=self.store == 'work_orders')
+        print(f'{self.store}: {self.added} rows {"to import" if dry_run else "imported"}'
+              + (f' ({self.completed} into completed)' if self.store == 'work_orders' else '')
+              + f', {self.skipped} blank or duplicate rows skipped', file=self.out)
+        return self.added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-import work orders or checklist rows from xlsx/CSV files.')
+    parser.add_argument('store', choices=['work_orders', 'checklist'])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--dry-run', action='store_true', help='count the rows without writing them')
+    args = parser.parse_args(argv)
+    Importer(args.store, args.chunk_rows).run(args.files, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import threading
+
+import pandas as pd
+
+import storage
+
+
+AGE_BUCKETS = [(0, 7, '0-7 days'), (8, 30, '8-30 days'), (31, 90, '31-90 days'), (91, None, 'over 90 days')]
+# facts of changed rows are kept aside until they reach this share of the
+# rest, then merged in one rebuild of the frame
+COMPACT_SHARE = 0.1
+
+
+def _text(df, column):
+    # categorical with '' for missing, so a fact costs a code per row
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype='category')
+    values = df[column]
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(object).where(values.notna(), '').astype(str).astype('category')
+    if values.isna().any():
+        if '' not in values.cat.categories:
+            values = values.cat.add_categories('')
+        values = values.fillna('')
+    return values
+
+
+def _dates(df, column, fmt):
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype='category')
+    return pd.to_datetime(df[column], errors='coerce').dt.strftime(fmt).fillna('').astype('category')
+
+
+def _ratings(df):
+    if 'Rating' not in df.columns:
+        return pd.Series(float('nan'), index=df.index)
+    return pd.to_numeric(df['Rating'], errors='coerce')
+
+
+def _open(df):
+    if 'Status' not in df.columns:
+        return df
+    return df[df['Status'] != 'Done']
+
+
+def backlog_facts(df):
+    df = _open(df)
+    return pd.DataFrame({
+        'location': _text(df, 'location'),
+        'Element': _text(df, 'Element'),
+        'responsible person': _text(df, 'responsible person'),
+        'orders': 1,
+        'safety': (_text(df, 'Safety related') == 'Yes').astype(int),
+        'quality': (_text(df, 'Quality related') == 'Yes').astype(int),
+    }, index=df.index)
+
+
+def aging_facts(df):
+    df = _open(df)
+    return pd.DataFrame({
+        'opened': _dates(df, 'Date', '%Y-%m-%d'),
+        'expected': _dates(df, 'Expected repair Date', '%Y-%m-%d'),
+        'orders': 1,
+    }, index=df.index)
+
+
+def rating_facts(df):
+    ratings = _ratings(df)
+    df = df[ratings.notna()]
+    return pd.DataFrame({
+        'month': _dates(df, 'Date', '%Y-%m'),
+        'location': _text(df, 'location'),
+        'Element': _text(df, 'Element'),
+        'ratings': 1,
+        'rating sum': ratings[ratings.notna()],
+    }, index=df.index)
+
+
+def repair_facts(df):
+    # calendar days: the repair date is picked without a time, so the time
+    # the order was raised must not count against it
+    days = (pd.to_datetime(df['Actual Repair Date'], errors='coerce').dt.normalize()
+            - pd.to_datetime(df['Date'], errors='coerce').dt.normalize()).dt.days
+    df = df[days.notna()]
+    return pd.DataFrame({
+        'month': _dates(df, 'Actual Repair Date', '%Y-%m'),
+        'location': _text(df, 'location'),
+        'repairs': 1,
+        'repair days': days[days.notna()],
+    }, index=df.index)
+
+
+def activity_facts(df):
+    return pd.DataFrame({
+        'month': _dates(df, 'modification Date', '%Y-%m'),
+        'modification type': _text(df, 'modification type'),
+        'changes': 1,
+    }, index=df.index)
+
+
+def rolled_activity_facts(df):
+    # months of the change log that retention rolled up into counts
+    return pd.DataFrame({
+        'month': _text(df, 'month'),
+        'modification type': _text(df, 'modification type'),
+        'changes': pd.to_numeric(df['changes'], errors='coerce').fillna(0) if 'changes' in df.columns else 0,
+    }, index=df.index)
+
+
+class Rollup:
+    # sums of per-row facts by group. Each row's facts are kept so a row that
+    # changes or is removed can take back what it added, which makes catching
+    # up cost the size of the change rather than of the store. Facts of
+    # changed rows go to `recent` and the superseded ones in `rows` are only
+    # listed in `stale`, so a delta never copies the whole frame
+
+    def __init__(self, facts, keys, values):
+        self.facts = facts
+        self.keys = keys
+        self.values = values
+        self._reset(pd.DataFrame(columns=keys + values))
+        self.totals = self._sum(self.rows)
+
+    def _sum(self, rows):
+        return rows.groupby(self.keys, observed=True)[self.values].sum()
+
+    def _reset(self, rows):
+        self.rows = rows
+        self.recent = rows.iloc[:0]
+        self.stale = pd.Index([], dtype='int64')
+
+    def rebuild(self, df):
+        self._reset(self.facts(df))
+        self.totals = self._sum(self.rows)
+
+    def apply(self, rows, deleted):
+        changed = rows.index.union(pd.Index(deleted, dtype='int64'))
+        old_rows = self.rows.index.intersection(changed).difference(self.stale)
+        old_recent = self.recent.index.intersection(changed)
+        new = self.facts(rows)
+        old = pd.concat([self.rows.loc[old_rows], self.recent.loc[old_recent]])
+        delta = self._sum(new).sub(self._sum(old), fill_value=0)
+        totals = self.totals.add(delta, fill_value=0)
+        # the first value is the row count; groups with no rows left go away
+        self.totals = totals[totals[self.values[0]] != 0]
+        self.stale = self.stale.union(old_rows)
+        self.recent = pd.concat([self.recent.drop(index=old_recent), new])
+        if len(self.recent) + len(self.stale) > COMPACT_SHARE * len(self.rows):
+            self._compact()
+
+    def _compact(self):
+        rows = pd.concat([self.rows.drop(index=self.stale), self.recent])
+        # frames with different categories concatenate as strings
+        for key in self.keys:
+            if not isinstance(rows[key].dtype, pd.CategoricalDtype):
+                rows[key] = rows[key].astype('category')
+        self._reset(rows)
+
+
+def _rollups():
+    ratings = lambda: Rollup(rating_facts, ['month', 'location', 'Element'], ['ratings', 'rating sum'])
+    return {
+        'work_orders': {
+            'backlog': Rollup(backlog_facts, ['location', 'Element', 'responsible person'],
+                              ['orders', 'safety', 'quality']),
+            'aging': Rollup(aging_facts, ['opened', 'expected'], ['orders']),
+            'ratings': ratings(),
+        },
+        'completed': {
+            'repairs': Rollup(repair_facts, ['month', 'location'], ['repairs', 'repair days']),
+            'ratings': ratings(),
+        },
+        'checklist': {
+            'ratings': ratings(),
+        },
+        'change_log': {
+            'activity': Rollup(activity_facts, ['month', 'modification type'], ['changes']),
+        },
+        'change_log_rollup': {
+            'activity': Rollup(rolled_activity_facts, ['month', 'modification type'], ['changes']),
+        },
+    }
+
+
+class Dashboard:
+    # process-wide aggregates shared by every session; refresh() costs one
+    # version lookup per store when nothing changed
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self.rollups = _rollups()
+
+    def refresh(self):
+        with self._lock:
+            for store, rollups in self.rollups.items():
+                since = self._versions.get(store)
+                if since is not None and storage.store_version(store) == since:
+                    continue
+                delta = None if since is None else storage.changes(store, since)
+                if delta is None:
+                    # uncached: the facts are all the dashboard keeps of it
+                    df, version = storage.load_store(store)
+                    for rollup in rollups.values():
+                        rollup.rebuild(df)
+                else:
+                    version, rows, deleted = delta
+                    for rollup in rollups.values():
+                        rollup.apply(rows, deleted)
+                self._versions[store] = version
+        return self
+
+    def _totals(self, store, name):
+        return self.rollups[store][name].totals.reset_index()
+
+    def backlog(self, by='location'):
+        return self._totals('work_orders', 'backlog').groupby(by)['orders'].sum().sort_values(ascending=False)
+
+    def aging(self, today):
+        totals = self._totals('work_orders', 'aging')
+        opened = pd.to_datetime(totals['opened'], errors='coerce')
+        expected = pd.to_datetime(totals['expected'], errors='coerce')
+        age = (pd.Timestamp(today) - opened).dt.days
+        buckets = {}
+        for low, high, label in AGE_BUCKETS:
+            in_bucket = (age >= low) & (age <= high if high is not None else True)
+            buckets[label] = int(totals.loc[in_bucket, 'orders'].sum())
+        overdue = int(totals.loc[expected < pd.Timestamp(today), 'orders'].sum())
+        unscheduled = int(totals.loc[expected.isna(), 'orders'].sum())
+        return pd.Series(buckets, name='orders'), overdue, unscheduled
+
+    def repairs(self):
+        # mean time to repair in days per month of completion
+        totals = self._totals('completed', 'repairs').groupby('month')[['repairs', 'repair days']].sum()
+        totals['mean days'] = totals['repair days'] / totals['repairs']
+        return totals
+
+    def rating_trend(self, location=None, element=None):
+        totals = pd.concat([self._totals(store, 'ratings') for store in ('work_orders', 'completed', 'checklist')])
+        if location:
+            totals = totals[totals['location'] == location]
+        if element:
+            totals = totals[totals['Element'] == element]
+        monthly = totals.groupby('month')[['ratings', 'rating sum']].sum()
+        return monthly['rating sum'] / monthly['ratings']
+
+    def activity(self):
+        totals = pd.concat([self._totals(store, 'activity') for store in ('change_log', 'change_log_rollup')])
+        return (totals
+                .pivot_table(index='month', columns='modification type', values='changes', aggfunc='sum', fill_value=0))
+
+    def summary(self, today):
+        _, overdue, unscheduled = self.aging(today)
+        repairs = self.repairs()
+        total_days = repairs['repair days'].sum()
+        total_repairs = repairs['repairs'].sum()
+        month = pd.Timestamp(today).strftime('%Y-%m')
+        return {
+            'backlog': int(self._totals('work_orders', 'backlog')['orders'].sum()),
+            'overdue': overdue,
+            'unscheduled': unscheduled,
+            'mttr': total_days / total_repairs if total_repairs else None,
+            'completed this month': int(repairs['repairs'].get(month, 0)),
+        }
+
+
+_dashboard = None
+_dashboard_lock = threading.Lock()
+
+
+def get_dashboard():
+    global _dashboard
+    with _dashboard_lock:
+        if _dashboard is None:
+            _dashboard = Dashboard()
+    return _dashboard.refresh()
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+import images
+import shared
+import storage
+
+
+egypt_tz = pytz.timezone('Africa/Cairo')
+DONE = 'Done'
+_archived = False
+
+
+def log_entry(event_id, modifier_name, modification_type, new_date):
+    return pd.DataFrame([{
+        'event id': event_id,
+        'modifier name': modifier_name,
+        'modification Date': datetime.now(egypt_tz).replace(tzinfo=None),
+        'modification type': modification_type,
+        'new Date': new_date,
+    }])
+
+
+def schedule(event_id, expected_date, modifier_name):
+    # open order keeps its row; only the expected date changes
+    new_date = expected_date.strftime('%Y-%m-%d')
+    return [
+        ('update', 'work_orders', 'event id', event_id, {'Expected repair Date': new_date}),
+        ('append', 'change_log', log_entry(event_id, modifier_name, 'update Expected repair Date', new_date)),
+    ]
+
+
+def complete(event_id, actual_date, modifier_name):
+    # the order is marked done and moved out of the open table into the
+    # archive partition of the month it was repaired
+    new_date = actual_date.strftime('%Y-%m-%d')
+    return [
+        ('archive', 'work_orders', 'completed', 'event id', event_id,
+         {'Actual Repair Date': new_date, 'Status': DONE}),
+        ('append', 'change_log', log_entry(event_id, modifier_name, 'update Actual Repair Date', new_date)),
+    ]
+
+
+def archive_done_orders():
+    # one-time move of orders completed before the archive existed; those
+    # already copied into the completed table are only removed
+    global _archived
+    if _archived:
+        return 0
+    _archived = True
+    open_orders = shared.snapshot('work_orders')[0]
+    if 'Status' not in open_orders.columns:
+        return 0
+    done = open_orders.loc[open_orders['Status'] == DONE, 'event id'].dropna().unique()
+    if not len(done):
+        return 0
+    completed = set(storage.load_store('completed')[0]['event id'].dropna())
+    ops = []
+    for event_id in done:
+        if event_id in completed:
+            ops.append(('delete', 'work_orders', 'event id', event_id))
+        else:
+            ops.append(('archive', 'work_orders', 'completed', 'event id', event_id, {}))
+    storage.apply(ops)
+    return len(ops)
+
+
+def validate_walk(detector_name, entries):
+    errors = []
+    if not detector_name.strip():
+        errors.append('Enter the detector name.')
+    for entry in entries:
+        if entry['Rating'] not in (0, 'N/A') and not entry['responsible person']:
+            errors.append(f"Choose a responsible person for {entry['Element']}.")
+    return errors
+
+
+def record_walk(location, detector_name, entries):
+    # one check row or work order per category of a location walk; event ids
+    # are allocated in one call and everything is appended in one transaction.
+    # Returns (ops, uploads) where uploads are the image bytes to store first
+    now = datetime.now(egypt_tz).replace(tzinfo=None)
+    checks = [e for e in entries if e['Rating'] in (0, 'N/A')]
+    orders = [e for e in entries if e['Rating'] not in (0, 'N/A')]
+    event_ids = storage.next_event_ids(len(orders)) if orders else []
+    uploads = {}
+    check_rows = []
+    for entry in checks:
+        check_rows.append({
+            'event id': 'check',
+            'location': location,
+            'Rating': entry['Rating'],
+            'Element': entry['Element'],
+            'Event Detector Name': detector_name,
+            'Date': now,
+            'comment': entry['comment']})
+    order_rows = []
+    for event_id, entry in zip(event_ids, orders):
+        image_path = ''
+        if entry['image']:
+            image_path = images.path_for_upload(entry['image'])
+            uploads[image_path] = entry['image']
+        order_rows.append({
+            'event id': event_id,
+            'location': location,
+            'Element': entry['Element'],
+            'Event Detector Name': detector_name,
+            'Date': now,
+            'Rating': entry['Rating'],
+            'comment': entry['comment'],
+            'responsible person': entry['responsible person'],
+            'Expected repair Date': '',
+            'Actual Repair Date': '',
+            'image path': image_path,
+            'Safety related': 'Yes' if entry['Safety related'] else 'No',
+            'Quality related': 'Yes' if entry['Quality related'] else 'No'})
+    ops = []
+    if check_rows:
+        ops.append(('append', 'checklist', pd.DataFrame(check_rows)))
+    if order_rows:
+        ops.append(('append', 'work_orders', pd.DataFrame(order_rows)))
+    return ops, list(uploads.values())
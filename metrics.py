@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from contextlib import nullcontext
+
+
+# off unless FACILITY_METRICS=1; a disabled span is a shared no-op context
+# manager and a disabled counter returns straight away
+ENABLED = os.environ.get('FACILITY_METRICS', '0') != '0'
+LOG_SIZE = 5000
+
+logger = logging.getLogger('facility.metrics')
+
+_events = deque(maxlen=LOG_SIZE)
+_local = threading.local()
+_NULL = nullcontext()
+_run_ids = itertools.count(1)
+
+
+class Run:
+    # spans and counters of one script rerun, on the thread running it
+
+    def __init__(self, name):
+        self.id = next(_run_ids)
+        self.name = name
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.elapsed = None
+        self.spans = {}
+        self.counters = {}
+
+    def add_span(self, name, seconds):
+        calls, total = self.spans.get(name, (0, 0.0))
+        self.spans[name] = (calls + 1, total + seconds)
+
+    def add_count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._start
+        return self
+
+    def summary(self):
+        return {
+            'event': 'rerun',
+            'run': self.id,
+            'name': self.name,
+            'time': self.started,
+            'ms': round((self.elapsed or 0) * 1000, 3),
+            'spans': {name: {'calls': calls, 'ms': round(seconds * 1000, 3)}
+                      for name, (calls, seconds) in self.spans.items()},
+            'counters': dict(self.counters),
+        }
+
+
+def _emit(event):
+    _events.append(event)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(event, default=str))
+
+
+class _Span:
+    __slots__ = ('name', 'fields', 'start')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        run = current_run()
+        if run is not None:
+            run.add_span(self.name, seconds)
+        event = {'event': 'span', 'span': self.name, 'time': time.time() - seconds, 'ms': round(seconds * 1000, 3),
+                 'thread': threading.current_thread().name, 'run': run.id if run is not None else None}
+        event.update(self.fields)
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        _emit(event)
+        return False
+
+
+def span(name, **fields):
+    # with metrics.span('load', store=store): ...
+    if not ENABLED:
+        return _NULL
+    return _Span(name, fields)
+
+
+def count(name, value=1):
+    # added to the rerun in progress
+    if not ENABLED:
+        return
+    run = current_run()
+    if run is not None:
+        run.add_count(name, value)
+
+
+def current_run():
+    return getattr(_local, 'run', None)
+
+
+def begin_run(name=''):
+    _local.run = Run(name) if ENABLED else None
+    return _local.run
+
+
+def end_run(name=None):
+    # logs the rerun's totals; None when metrics are off
+    run = current_run()
+    _local.run = None
+    if run is None:
+        return None
+    if name is not None:
+        run.name = name
+    run.finish()
+    _emit(run.summary())
+    return run
+
+
+def events():
+    return list(_events)
+
+
+def export_log():
+    # the recent spans and reruns as JSON lines
+    return ''.join(json.dumps(event, default=str) + '\n' for event in events()).encode()
@@ -0,0 +1,75 @@
+import pandas as pd
+
+
+# bumped when stored values need migrating to a new layout
+VERSION = 1
+RATING_NA = 'Rating N/A'
+NA_VALUES = ('N/A', 'NA', 'n/a')
+
+# column -> in-memory dtype, shared by every store that has the column.
+# Repeated labels are categoricals, the 0-3 rating is a nullable integer
+# with a separate flag for 'N/A', and every date is a real datetime
+COLUMN_TYPES = {
+    'Date': 'datetime',
+    'Expected repair Date': 'datetime',
+    'Actual Repair Date': 'datetime',
+    'modification Date': 'datetime',
+    'new Date': 'datetime',
+    'last modification Date': 'datetime',
+    'last new Date': 'datetime',
+    'location': 'category',
+    'Element': 'category',
+    'Event Detector Name': 'category',
+    'responsible person': 'category',
+    'Safety related': 'category',
+    'Quality related': 'category',
+    'Status': 'category',
+    'modifier name': 'category',
+    'modification type': 'category',
+    'Rating': 'rating',
+    RATING_NA: 'flag',
+}
+
+
+def columns_of(kind):
+    return [col for col, t in COLUMN_TYPES.items() if t == kind]
+
+
+def _is_na_rating(series):
+    return series.astype(object).isin(NA_VALUES)
+
+
+def apply(df):
+    # converts df in place to the schema dtypes and returns it; columns that
+    # already have their dtype are left alone, so re-applying is cheap
+    if 'Rating' in df.columns and not isinstance(df['Rating'].dtype, pd.Int64Dtype):
+        na = _is_na_rating(df['Rating'])
+        flag = df[RATING_NA] if RATING_NA in df.columns else pd.Series(False, index=df.index)
+        df[RATING_NA] = flag.fillna(False).astype(bool) | na
+        df['Rating'] = pd.to_numeric(df['Rating'].mask(na), errors='coerce').round().astype('Int64')
+    for col in df.columns:
+        kind = COLUMN_TYPES.get(col)
+        series = df[col]
+        if kind == 'datetime' and not pd.api.types.is_datetime64_any_dtype(series):
+            # stored dates are ISO strings, with or without a time part
+            df[col] = pd.to_datetime(series.mask(series.astype(object) == ''), errors='coerce', format='ISO8601')
+        elif kind == 'category' and not isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = series.mask(series.astype(object) == '').astype('category')
+        elif kind == 'flag' and series.dtype != bool:
+            df[col] = series.astype(object).fillna(False).astype(bool)
+    return df
+
+
+def concat(frames):
+    # categoricals with different categories would concat to object, so
+    # widen them to the union first
+    frames = [f for f in frames if len(f.columns)]
+    for col in set().union(*(f.columns for f in frames)):
+        dtypes = [f[col].dtype for f in frames if col in f.columns]
+        if len(dtypes) > 1 and all(isinstance(d, pd.CategoricalDtype) for d in dtypes):
+            categories = pd.Index([])
+            for dtype in dtypes:
+                categories = categories.union(dtype.categories)
+            frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) if col in f.columns else f
+                      for f in frames]
+    return pd.concat(frames)
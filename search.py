@@ -0,0 +1,153 @@
+import re
+import shlex
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+ALL_COLUMNS = 'All Columns'
+TOKEN_RE = re.compile(r'\w+')
+OPERATORS = ('AND', 'OR')
+
+
+def _normalize(series):
+    text = series.astype(str).str.lower()
+    return text.where(series.notna(), '').tolist()
+
+
+def parse_query(query):
+    # 'a AND b OR c' -> [['a', 'b'], ['c']]: AND binds tighter than OR and
+    # the words between two operators form one phrase, as before
+    try:
+        words = shlex.split(query)
+    except ValueError:
+        words = query.split()
+    groups = [[]]
+    phrase = []
+    for word in words + ['OR']:
+        if word in OPERATORS:
+            if phrase:
+                groups[-1].append(' '.join(phrase))
+            phrase = []
+            if word == 'OR':
+                groups.append([])
+        else:
+            phrase.append(word)
+    return [g for g in groups if g]
+
+
+class _Postings:
+    # token -> row ids for one column; the vocabulary is also kept as one
+    # newline-joined string so substring lookups run in C
+
+    def __init__(self):
+        self.tokens = []
+        self.ids = []
+        self.position = {}
+        self._text = None
+        self._starts = None
+
+    def add(self, token, row):
+        idx = self.position.get(token)
+        if idx is None:
+            idx = self.position[token] = len(self.tokens)
+            self.tokens.append(token)
+            self.ids.append(array('q'))
+            self._text = None
+        self.ids[idx].append(row)
+
+    def matching(self, piece):
+        if self._text is None:
+            self._text = '\n'.join(self.tokens)
+            self._starts = np.cumsum([0] + [len(t) + 1 for t in self.tokens[:-1]])
+        hits = [m.start() for m in re.finditer(re.escape(piece), self._text)]
+        if not hits:
+            return []
+        return np.unique(np.searchsorted(self._starts, hits, side='right') - 1)
+
+
+class SearchIndex:
+    # inverted token index per column; appending rows only tokenizes the new
+    # rows
+
+    def __init__(self, df):
+        self.columns = []
+        self._lookup = {}
+        self._postings = {}
+        self._size = 0
+        self.append(df)
+
+    def __len__(self):
+        return self._size
+
+    def append(self, rows):
+        for col in rows.columns:
+            if str(col).lower() not in self._lookup:
+                self.columns.append(str(col))
+                self._lookup[str(col).lower()] = str(col)
+                self._postings[str(col)] = _Postings()
+        base = self._size
+        for col in rows.columns:
+            postings = self._postings[str(col)]
+            seen = {}
+            for i, text in enumerate(_normalize(rows[col]), base):
+                tokens = seen.get(text)
+                if tokens is None:
+                    tokens = seen[text] = set(TOKEN_RE.findall(text))
+                for token in tokens:
+                    postings.add(token, i)
+        self._size += len(rows)
+
+    def _piece_mask(self, piece, columns):
+        mask = np.zeros(self._size, dtype=bool)
+        for col in columns:
+            postings = self._postings[col]
+            for idx in postings.matching(piece):
+                mask[np.frombuffer(postings.ids[idx], dtype=np.int64)] = True
+        return mask
+
+    def _term_mask(self, term, option, df):
+        columns = self.columns
+        if option != ALL_COLUMNS:
+            if str(option).lower() not in self._lookup:
+                return np.zeros(self._size, dtype=bool)
+            columns = [self._lookup[str(option).lower()]]
+        elif ':' in term:
+            prefix, value = term.split(':', 1)
+            if prefix.lower() in self._lookup and value:
+                columns, term = [self._lookup[prefix.lower()]], value
+        term = term.lower()
+        pieces = TOKEN_RE.findall(term)
+        if len(pieces) == 1 and pieces[0] == term:
+            return self._piece_mask(term, columns)
+        mask = np.zeros(self._size, dtype=bool)
+        for col in columns:
+            col_mask = np.ones(self._size, dtype=bool)
+            for piece in pieces:
+                col_mask &= self._piece_mask(piece, [col])
+            mask |= col_mask
+        if df is None:
+            return mask
+        # phrases and punctuation: confirm the exact substring on the
+        # candidate rows only
+        candidates = np.flatnonzero(mask) if pieces else np.arange(self._size)
+        found = np.zeros(len(candidates), dtype=bool)
+        for col in columns:
+            text = pd.Series(_normalize(df[col].iloc[candidates]), dtype=object)
+            found |= text.str.contains(term, regex=False).to_numpy(dtype=bool)
+        mask[:] = False
+        mask[candidates[found]] = True
+        return mask
+
+    def mask(self, query, option=ALL_COLUMNS, df=None):
+        result = np.zeros(self._size, dtype=bool)
+        for group in parse_query(query):
+            group_mask = np.ones(self._size, dtype=bool)
+            for term in group:
+                group_mask &= self._term_mask(term, option, df)
+            result |= group_mask
+        return result
+
+    def search(self, df, query, option=ALL_COLUMNS):
+        return df.iloc[self.mask(query, option, df)]
@@ -0,0 +1,133 @@
+import os
+import atexit
+import threading
+
+import pandas as pd
+
+import metrics
+import schema
+import storage
+from search import SearchIndex
+
+
+# every session is handed the same frames. Copy-on-write (always on from
+# pandas 3) turns an in-place change by one session into a private copy
+# instead of an edit to the shared data
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# typed frames saved for the next process; a warm start loads the pickle and
+# fetches only the rows written since it was saved
+SNAPSHOT_DIR = os.environ.get('FACILITY_SNAPSHOT_DIR', 'snapshots')
+
+
+def _layout():
+    # a snapshot typed under other column types is loaded afresh, even when
+    # the type change came without a schema.VERSION bump
+    return schema.VERSION, sorted(schema.COLUMN_TYPES.items())
+
+
+class SharedTable:
+    # the one in-memory copy of a store for this process. A newer version
+    # replaces the frame rather than editing it, so a session keeps a
+    # consistent snapshot until it asks again
+
+    def __init__(self, store):
+        self.store = store
+        self.df = None
+        self.version = None
+        self._index = None
+        self._saved = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(SNAPSHOT_DIR, f'{self.store}.pkl')
+
+    def _load(self):
+        identity = storage.store_identity(self.store)
+        try:
+            saved = pd.read_pickle(self.path)
+        except Exception:
+            saved = None
+        if (saved is not None and saved['identity'] == identity and saved.get('layout') == _layout()
+                and saved['version'] <= storage.store_version(self.store)):
+            with metrics.span('snapshot catch-up', store=self.store):
+                self.df, self.version, _ = storage.refresh(self.store, saved['df'], saved['version'])
+            self._saved = saved['version']
+        else:
+            self.df, self.version = storage.load_store(self.store)
+            # written off the render path; the first page draws without waiting
+            threading.Thread(target=self.save, name=f'snapshot-{self.store}', daemon=True).start()
+
+    def save(self):
+        with self._lock:
+            if self.df is None or self.version == self._saved:
+                return
+            df, version = self.df, self.version
+            self._saved = version
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp = f'{self.path}.{threading.get_ident()}.tmp'
+        pd.to_pickle({'identity': storage.store_identity(self.store), 'layout': _layout(), 'version': version,
+                      'df': df}, tmp)
+        os.replace(tmp, self.path)
+
+    def snapshot(self):
+        # (df, version); catching up fetches only the rows written since the
+        # last snapshot any session took
+        with self._lock:
+            if self.df is None:
+                self._load()
+                return self.df, self.version
+            df, version, rows = storage.refresh(self.store, self.df, self.version)
+            if version != self.version:
+                if self._index is not None:
+                    if rows is not None and not rows.index.isin(self.df.index).any():
+                        self._index.append(rows)
+                    else:
+                        self._index = None
+                self.df, self.version = df, version
+            return self.df, self.version
+
+    def search(self, df, query, option):
+        # the shared index serves snapshots of the current version; an older
+        # snapshot gets a private one
+        with self._lock:
+            if df is self.df and self._index is not None:
+                index = self._index
+            else:
+                with metrics.span('search index', store=self.store, rows=len(df)):
+                    index = SearchIndex(df)
+                if df is self.df:
+                    self._index = index
+        with metrics.span('search', store=self.store):
+            return index.search(df, query, option)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(store):
+    with _tables_lock:
+        if store not in _tables:
+            _tables[store] = SharedTable(store)
+        return _tables[store]
+
+
+def snapshot(store):
+    return get_table(store).snapshot()
+
+
+def save_all():
+    with _tables_lock:
+        tables = list(_tables.values())
+    for table in tables:
+        table.save()
+
+
+atexit.register(save_all)
+
+
+def search(store, df, query, option):
+    return get_table(store).search(df, query, option)
@@ -0,0 +1,889 @@
+import os
+import re
+import random
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date
+
+import pandas as pd
+
+import schema
+import metrics
+
+WORK_ORDER_COLUMNS = [
+    'event id', 'location', 'Element', 'Event Detector Name',
+    'Date', 'Rating', 'Rating N/A', 'responsible person',
+    'Expected repair Date', 'Actual Repair Date', 'image path', 'comment', 'Safety related', 'Quality related']
+
+CHECKLIST_COLUMNS = [
+    'event id', 'location', 'Element',
+    'Event Detector Name', 'Date', 'Rating', 'Rating N/A', 'comment']
+
+CHANGE_LOG_COLUMNS = [
+    'event id', 'modifier name', 'modification Date',
+    'modification type', 'new Date']
+
+CHANGE_LOG_ROLLUP_COLUMNS = [
+    'month', 'event id', 'modifier name', 'modification type',
+    'changes', 'last modification Date', 'last new Date']
+
+# store name -> table, legacy workbook, default columns and optionally the
+# date column that splits it into monthly partitions and the column lists
+# queries look up by; dtypes live in schema
+STORES = {
+    'work_orders': {
+        'table': 'work_orders',
+        'xlsx': 'work_order_records.xlsx',
+        'columns': WORK_ORDER_COLUMNS,
+        # update and archive find their row by event id
+        'indexes': [['event id']],
+    },
+    'checklist': {
+        'table': 'checklist',
+        'xlsx': 'checklist.xlsx',
+        'columns': CHECKLIST_COLUMNS,
+    },
+    'completed': {
+        'table': 'completed_work_orders',
+        'xlsx': 'completed_work_order.xlsx',
+        'columns': WORK_ORDER_COLUMNS,
+        # archived per month of completion
+        'partition': 'Actual Repair Date',
+        'indexes': [['event id']],
+    },
+    'change_log': {
+        'table': 'change_log',
+        'xlsx': 'change_log.xlsx',
+        'columns': CHANGE_LOG_COLUMNS,
+        'indexes': [['event id', 'modification Date'], ['modifier name', 'modification Date'],
+                    ['modification Date']],
+    },
+    'change_log_rollup': {
+        'table': 'change_log_rollup',
+        'xlsx': 'change_log_rollup.xlsx',
+        'columns': CHANGE_LOG_ROLLUP_COLUMNS,
+        'indexes': [['event id'], ['month']],
+    },
+}
+
+DB_PATH = os.environ.get('FACILITY_DB', 'facility.db')
+EVENT_ID_PREFIX = 'Work Order '
+EVENT_ID_RE = re.compile(r'^\s*Work Order\s+(\d+)\s*$')
+# stores whose 'event id' values the work-order sequence must stay above
+EVENT_ID_STORES = ['work_orders', 'completed']
+# deleted row ids are kept for this many versions of a store; a reader
+# further behind than that reloads the store in full
+TOMBSTONE_VERSIONS = 1000
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def max_event_number(ids):
+    # highest N among 'Work Order N' ids; anything else is ignored
+    best = 0
+    for value in ids:
+        match = EVENT_ID_RE.match(str(value))
+        if match:
+            best = max(best, int(match.group(1)))
+    return best
+
+
+@contextmanager
+def file_lock(path, timeout=30, stale=120):
+    # portable cross-process lock: whoever creates <path>.lock owns it
+    lock = path + '.lock'
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > stale:
+                    os.remove(lock)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Could not lock {path}')
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock)
+        except FileNotFoundError:
+            pass
+
+
+def _to_db_value(value):
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    if isinstance(value, datetime):
+        value = pd.Timestamp(value)
+        if value.tzinfo:
+            value = value.tz_localize(None)
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _db_column(series):
+    # column-wise _to_db_value for bulk inserts
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        series = series.dt.tz_localize(None)
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        # same text as isoformat(sep=' '): microseconds only when non-zero
+        text = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+        fraction = series.dt.microsecond != 0
+        text[fraction] = series[fraction].dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+        series = text
+    elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+        return [_to_db_value(v) for v in series]
+    return series.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def _event_ids(first, count):
+    return [f'{EVENT_ID_PREFIX}{n}' for n in range(first, first + count)]
+
+
+def _missing_ids(rows):
+    if 'event id' not in rows.columns:
+        rows['event id'] = None
+    ids = rows['event id'].astype(object)
+    return (ids.isna() | (ids == '')).to_numpy()
+
+
+def partition_of(values):
+    # 'YYYY-MM' of a date column, '' where the date is missing
+    months = pd.to_datetime(pd.Series(values), errors='coerce').dt.strftime('%Y-%m')
+    return months.fillna('').tolist()
+
+
+def _query_mask(df, where, between):
+    mask = pd.Series(True, index=df.index)
+    for column, value in (where or {}).items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        mask &= df[column].isin(values) if column in df.columns else False
+    if between is not None:
+        column, start, end = between
+        dates = pd.to_datetime(df[column], errors='coerce') if column in df.columns else pd.Series(pd.NaT, index=df.index)
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start)
+        if end is not None:
+            mask &= dates < pd.Timestamp(end)
+    return mask
+
+
+def _op_stores(ops):
+    stores = []
+    for op in ops:
+        stores.append(op[1])
+        if op[0] == 'archive':
+            stores.append(op[2])
+    return list(dict.fromkeys(stores))
+
+
+class ExcelBackend:
+    # the original storage: every write rewrites the whole workbook, so
+    # writes re-read the file under a lock and merge into the latest copy
+
+    def source_files(self, store):
+        return [STORES[store]['xlsx']]
+
+    def identity(self, store):
+        # versions are file mtimes, so the path is enough to tell sources apart
+        return f"excel:{os.path.abspath(STORES[store]['xlsx'])}"
+
+    def version(self, store):
+        try:
+            return os.stat(STORES[store]['xlsx']).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _read(self, store):
+        spec = STORES[store]
+        if os.path.exists(spec['xlsx']):
+            # typed on read, so the next write stores the migrated values
+            with metrics.span('excel parse', store=store):
+                return schema.apply(pd.read_excel(spec['xlsx'], engine='openpyxl'))
+        return pd.DataFrame(columns=spec['columns'])
+
+    def _write(self, store, df):
+        # readers don't take the lock, so never let them see a half-written file
+        path = STORES[store]['xlsx']
+        with metrics.span('excel write', store=store):
+            df.to_excel(path + '.tmp.xlsx', index=False, engine='openpyxl')
+            os.replace(path + '.tmp.xlsx', path)
+        metrics.count('bytes written', os.path.getsize(path))
+
+    def _partition_mask(self, store, df, partition):
+        return pd.Series(partition_of(df[STORES[store]['partition']]), index=df.index) == partition
+
+    def read(self, store, partition=None):
+        version = self.version(store)
+        df = self._read(store)
+        if partition is not None:
+            df = df[self._partition_mask(store, df, partition)].reset_index(drop=True)
+        return df, version
+
+    def partitions(self, store):
+        df = self._read(store)
+        return sorted(set(partition_of(df[STORES[store]['partition']])), reverse=True)
+
+    def changes(self, store, since):
+        # no row versions in a workbook: any change means a full reload
+        return None
+
+    def query(self, store, where=None, between=None, order_by=None, descending=False, limit=None, offset=0):
+        df = self._read(store)
+        mask = _query_mask(df, where, between)
+        df = df[mask]
+        if order_by is not None:
+            df = df.sort_values(order_by, ascending=not descending, kind='stable')
+        stop = None if limit is None else offset + limit
+        return df.iloc[offset:stop], len(df)
+
+    def _update(self, df, key_column, key, values):
+        match = df[key_column] == key
+        for col, value in values.items():
+            df[col] = df[col].astype(object) if col in df.columns else None
+            df.loc[match, col] = value
+        return match
+
+    def apply(self, ops):
+        # not atomic across workbooks; each file is locked while it is rewritten
+        results = []
+        for op in ops:
+            if op[0] == 'append':
+                _, store, rows = op
+                with file_lock(STORES[store]['xlsx']):
+                    self._write(store, pd.concat([self._read(store), rows], ignore_index=True))
+                results.append(len(rows))
+            elif op[0] == 'update':
+                _, store, key_column, key, values = op
+                with file_lock(STORES[store]['xlsx']):
+                    df = self._read(store)
+                    match = self._update(df, key_column, key, values)
+                    self._write(store, df)
+                results.append(int(match.sum()))
+            elif op[0] == 'archive':
+                _, source, target, key_column, key, values = op
+                with file_lock(STORES[source]['xlsx']):
+                    df = self._read(source)
+                    match = self._update(df, key_column, key, values)
+                    moved = df[match]
+                    self._write(source, df[~match])
+                with file_lock(STORES[target]['xlsx']):
+                    self._write(target, pd.concat([self._read(target), moved], ignore_index=True))
+                results.append(len(moved))
+            elif op[0] == 'delete':
+                _, store, key_column, key = op
+                with file_lock(STORES[store]['xlsx']):
+                    df = self._read(store)
+                    match = df[key_column] == key
+                    self._write(store, df[~match])
+                results.append(int(match.sum()))
+            elif op[0] == 'prune':
+                _, store, column, before = op
+                with file_lock(STORES[store]['xlsx']):
+                    df = self._read(store)
+                    match = pd.to_datetime(df[column], errors='coerce') < pd.Timestamp(before)
+                    if match.any():
+                        self._write(store, df[~match])
+                results.append(int(match.sum()))
+            else:
+                raise ValueError(f'Unknown storage operation: {op[0]}')
+        return results
+
+    def replace(self, store, df):
+        with file_lock(STORES[store]['xlsx']):
+            self._write(store, df)
+
+    def append_chunks(self, stores, chunks, assign_ids=False):
+        # each workbook is rewritten once, after the last chunk
+        frames = {store: [] for store in stores}
+        for store, rows in chunks:
+            frames[store].append(rows)
+        ops = []
+        for store, parts in frames.items():
+            if not parts:
+                continue
+            rows = schema.concat(parts).reset_index(drop=True)
+            if assign_ids:
+                missing = _missing_ids(rows)
+                count = int(missing.sum())
+                rows['event id'] = rows['event id'].astype(object)
+                if count:
+                    rows.loc[missing, 'event id'] = _event_ids(self.allocate('event_id', count), count)
+            ops.append(('append', store, rows))
+        return sum(self.apply(ops))
+
+    def allocate(self, name, count):
+        path = f'{name}.seq'
+        with file_lock(path):
+            if os.path.exists(path):
+                with open(path) as f:
+                    value = int(f.read().strip() or 0)
+            else:
+                value = max(max_event_number(self._read(store)['event id'].dropna())
+                            for store in EVENT_ID_STORES)
+            with open(path + '.tmp', 'w') as f:
+                f.write(str(value + count))
+            os.replace(path + '.tmp', path)
+        return value + 1
+
+
+class SQLiteBackend:
+    # append-only tables in one sqlite file; a new row costs one INSERT.
+    # Every write bumps the store's version and stamps the rows it touched
+    # with it, so readers can fetch just what changed since their copy.
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._ready = set()
+
+    def source_files(self, store):
+        # committed rows may still sit in the WAL file until a checkpoint
+        return [self.path, self.path + '-wal']
+
+    def identity(self, store):
+        # versions restart when the database is recreated, so a random id
+        # written at creation tells two databases at the same path apart
+        self._prepare(store)
+        conn = self.connect()
+        try:
+            instance = conn.execute("SELECT value FROM sequences WHERE name = 'instance'").fetchone()[0]
+        finally:
+            conn.close()
+        return f'sqlite:{os.path.abspath(self.path)}:{instance}'
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def transaction(self, write=False):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent
+        # sessions and processes are serialized instead of failing mid-way
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _columns(self, conn, table):
+        return [r[1] for r in conn.execute(f'PRAGMA table_info({_quote(table)})') if not r[1].startswith('_')]
+
+    def _ensure_meta(self, conn):
+        conn.execute('CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO sequences (name, value) VALUES ('instance', ?)", (random.getrandbits(62),))
+        conn.execute('CREATE TABLE IF NOT EXISTS versions (store TEXT PRIMARY KEY, '
+                     'version INTEGER NOT NULL DEFAULT 0, reset INTEGER NOT NULL DEFAULT 0)')
+        conn.execute('CREATE TABLE IF NOT EXISTS tombstones (store TEXT NOT NULL, '
+                     'row INTEGER NOT NULL, version INTEGER NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS tombstones_version ON tombstones (store, version)')
+
+    def _ensure_table(self, conn, store, columns=()):
+        spec = STORES[store]
+        table = spec['table']
+        info = [r[1] for r in conn.execute(f'PRAGMA table_info({_quote(table)})')]
+        if not info:
+            self._ensure_meta(conn)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {_quote(table)} (_rowid INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         '_version INTEGER NOT NULL DEFAULT 0, _partition TEXT, '
+                         + ', '.join(_quote(c) for c in spec['columns']) + ')')
+            info = ['_rowid', '_version', '_partition'] + list(spec['columns'])
+            self._seed_from_excel(conn, store)
+        for hidden, ddl in (('_version', 'INTEGER NOT NULL DEFAULT 0'), ('_partition', 'TEXT')):
+            if hidden not in info:
+                self._ensure_meta(conn)
+                conn.execute(f'ALTER TABLE {_quote(table)} ADD COLUMN {hidden} {ddl}')
+                info.append(hidden)
+        for col in columns:
+            if col not in info:
+                conn.execute(f'ALTER TABLE {_quote(table)} ADD COLUMN {_quote(col)}')
+                info.append(col)
+        return [c for c in info if not c.startswith('_')]
+
+    def _prepare(self, store):
+        # creating or migrating a table is a write, so do it once up front
+        # rather than inside a read transaction
+        if store in self._ready:
+            return
+        spec = STORES[store]
+        with self.transaction(write=True) as conn:
+            self._ensure_meta(conn)
+            self._ensure_table(conn, store)
+            if spec.get('partition'):
+                table = _quote(spec['table'])
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {_quote(spec["table"] + "_partition")} '
+                             f'ON {table} (_partition)')
+                conn.execute(f"UPDATE {table} SET _partition = COALESCE(substr({_quote(spec['partition'])}, 1, 7), '') "
+                             'WHERE _partition IS NULL')
+            for columns in spec.get('indexes', ()):
+                name = re.sub(r'\W+', '_', '_'.join([spec['table']] + columns).lower())
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {_quote(name)} ON {_quote(spec["table"])} ('
+                             + ', '.join(_quote(c) for c in columns) + ')')
+            # migrated once per database, not on every start
+            marker = f'schema:{store}'
+            row = conn.execute('SELECT value FROM sequences WHERE name = ?', (marker,)).fetchone()
+            if row is None or row[0] < schema.VERSION:
+                if self._migrate(conn, store):
+                    self._bump(conn, store, reset=True)
+                conn.execute('INSERT OR REPLACE INTO sequences (name, value) VALUES (?, ?)', (marker, schema.VERSION))
+        self._ready.add(store)
+
+    def _migrate(self, conn, store):
+        # values written before the typed schema: 'N/A' ratings move to the
+        # flag column and blank dates and labels become NULL
+        table = _quote(STORES[store]['table'])
+        columns = self._columns(conn, STORES[store]['table'])
+        changed = 0
+        if 'Rating' in columns:
+            self._ensure_table(conn, store, [schema.RATING_NA])
+            changed += conn.execute(
+                f'UPDATE {table} SET {_quote(schema.RATING_NA)} = 1, Rating = NULL WHERE Rating IN ('
+                + ', '.join('?' for _ in schema.NA_VALUES) + ')', schema.NA_VALUES).rowcount
+        for col in schema.columns_of('datetime') + schema.columns_of('category'):
+            if col in columns:
+                changed += conn.execute(f"UPDATE {table} SET {_quote(col)} = NULL WHERE {_quote(col)} = ''").rowcount
+        return changed
+
+    def _seed_from_excel(self, conn, store):
+        # one-time migration of the legacy workbook into the new table
+        xlsx = STORES[store]['xlsx']
+        if not os.path.exists(xlsx):
+            return
+        legacy = schema.apply(pd.read_excel(xlsx, engine='openpyxl'))
+        if not legacy.empty:
+            self._insert(conn, store, legacy, 0)
+
+    def _version(self, conn, store):
+        row = conn.execute('SELECT version, reset FROM versions WHERE store = ?', (store,)).fetchone()
+        return row or (0, 0)
+
+    def _bump(self, conn, store, reset=False):
+        version = self._version(conn, store)[0] + 1
+        conn.execute('INSERT INTO versions (store, version, reset) VALUES (?, ?, ?) '
+                     'ON CONFLICT(store) DO UPDATE SET version = excluded.version'
+                     + (', reset = excluded.version' if reset else ''),
+                     (store, version, version if reset else 0))
+        if reset:
+            # a reset forces every reader to reload, so no deletion is needed
+            conn.execute('DELETE FROM tombstones WHERE store = ?', (store,))
+        elif version % TOMBSTONE_VERSIONS == 0:
+            self._compact(conn, store, version - TOMBSTONE_VERSIONS)
+        return version
+
+    def _compact(self, conn, store, horizon):
+        # drop the deletions up to horizon; readers older than that get None
+        # from changes() and reload, the same as after a reset
+        conn.execute('DELETE FROM tombstones WHERE store = ? AND version <= ?', (store, horizon))
+        conn.execute('UPDATE versions SET reset = MAX(reset, ?) WHERE store = ?', (horizon, store))
+
+    def _insert(self, conn, store, rows, version):
+        spec = STORES[store]
+        columns = [str(c) for c in rows.columns]
+        self._ensure_table(conn, store, columns)
+        hidden = ['_version']
+        extra = [[version] * len(rows)]
+        if spec.get('partition'):
+            hidden.append('_partition')
+            source = rows[spec['partition']] if spec['partition'] in rows.columns else [None] * len(rows)
+            extra.append(list(partition_of(source)))
+        sql = (f'INSERT INTO {_quote(spec["table"])} (' + ', '.join(hidden + [_quote(c) for c in columns])
+               + ') VALUES (' + ', '.join('?' for _ in hidden + columns) + ')')
+        # values are converted a column at a time and zipped into rows
+        values = zip(*extra, *(_db_column(rows.iloc[:, i]) for i in range(len(columns))))
+        conn.executemany(sql, values)
+
+    def _update(self, conn, store, key_column, key, values, version):
+        # single-row write: only the matching rows are touched, so rows other
+        # sessions appended in the meantime are kept
+        self._ensure_table(conn, store, list(values))
+        assignments = ', '.join(f'{_quote(c)} = ?' for c in values)
+        params = [version] + [_to_db_value(v) for v in values.values()]
+        partition = STORES[store].get('partition')
+        if partition in values:
+            assignments += ', _partition = ?'
+            params += partition_of([values[partition]])
+        cursor = conn.execute(
+            f'UPDATE {_quote(STORES[store]["table"])} SET _version = ?, {assignments} WHERE {_quote(key_column)} = ?',
+            params + [_to_db_value(key)])
+        return cursor.rowcount
+
+    def _delete(self, conn, store, rowids, version):
+        table = _quote(STORES[store]['table'])
+        conn.executemany(f'DELETE FROM {table} WHERE _rowid = ?', [(int(r),) for r in rowids])
+        conn.executemany('INSERT INTO tombstones (store, row, version) VALUES (?, ?, ?)',
+                         [(store, int(r), version) for r in rowids])
+
+    def _select(self, conn, store, where='', params=(), order='_rowid', limit=None, offset=0):
+        columns = self._columns(conn, STORES[store]['table'])
+        page = ''
+        if limit is not None:
+            page = ' LIMIT ? OFFSET ?'
+            params = list(params) + [limit, offset]
+        df = pd.read_sql_query(
+            'SELECT _rowid, ' + ', '.join(_quote(c) for c in columns)
+            + f' FROM {_quote(STORES[store]["table"])} {where} ORDER BY {order}{page}',
+            conn, params=params, index_col='_rowid')
+        df.index.name = None
+        return df
+
+    def version(self, store):
+        self._prepare(store)
+        conn = self.connect()
+        try:
+            return self._version(conn, store)[0]
+        finally:
+            conn.close()
+
+    def read(self, store, partition=None):
+        # rows and version come from the same snapshot
+        self._prepare(store)
+        with self.transaction() as conn:
+            version = self._version(conn, store)[0]
+            if partition is None:
+                df = self._select(conn, store)
+            else:
+                df = self._select(conn, store, 'WHERE _partition = ?', (partition,))
+        return df, version
+
+    def partitions(self, store):
+        self._prepare(store)
+        with self.transaction() as conn:
+            rows = conn.execute(f'SELECT DISTINCT _partition FROM {_quote(STORES[store]["table"])} '
+                                'ORDER BY _partition DESC').fetchall()
+        return [r[0] for r in rows]
+
+    def query(self, store, where=None, between=None, order_by=None, descending=False, limit=None, offset=0):
+        # one page of matching rows and the number of matches; equality and
+        # date range filters on indexed columns are answered from the index
+        self._prepare(store)
+        clauses, params = [], []
+        for column, value in (where or {}).items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f'{_quote(column)} IN (' + ', '.join('?' for _ in values) + ')')
+            params += [_to_db_value(v) for v in values]
+        if between is not None:
+            column, start, end = between
+            if start is not None:
+                clauses.append(f'{_quote(column)} >= ?')
+                params.append(_to_db_value(pd.Timestamp(start)))
+            if end is not None:
+                clauses.append(f'{_quote(column)} < ?')
+                params.append(_to_db_value(pd.Timestamp(end)))
+        where_sql = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        order = '_rowid'
+        if order_by is not None:
+            direction = ' DESC' if descending else ''
+            order = f'{_quote(order_by)}{direction}, _rowid{direction}'
+        with self.transaction() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM {_quote(STORES[store]["table"])} {where_sql}', params).fetchone()[0]
+            df = self._select(conn, store, where_sql, params, order, limit, offset)
+        return df, total
+
+    def changes(self, store, since):
+        # rows written and row ids deleted after `since`; None when the store
+        # was rewritten and must be reloaded
+        self._prepare(store)
+        with self.transaction() as conn:
+            version, reset = self._version(conn, store)
+            if reset > since:
+                return None
+            rows = self._select(conn, store, 'WHERE _version > ?', (since,))
+            deleted = [r[0] for r in conn.execute(
+                'SELECT row FROM tombstones WHERE store = ? AND version > ?', (store, since))]
+        return version, rows, deleted
+
+    def apply(self, ops):
+        # several appends, updates and archive moves in one transaction; each
+        # touched store gets a single version bump
+        for store in _op_stores(ops):
+            self._prepare(store)
+        results = []
+        with self.transaction(write=True) as conn:
+            versions = {}
+
+            def version(store):
+                if store not in versions:
+                    versions[store] = self._bump(conn, store)
+                return versions[store]
+
+            for op in ops:
+                if op[0] == 'append':
+                    _, store, rows = op
+                    if not rows.empty:
+                        self._insert(conn, store, rows, version(store))
+                    results.append(len(rows))
+                elif op[0] == 'update':
+                    _, store, key_column, key, values = op
+                    results.append(self._update(conn, store, key_column, key, values, version(store)))
+                elif op[0] == 'archive':
+                    # single-row status change, then move the row to the archive
+                    _, source, target, key_column, key, values = op
+                    if values:
+                        self._update(conn, source, key_column, key, values, version(source))
+                    moved = self._select(conn, source, f'WHERE {_quote(key_column)} = ?', (_to_db_value(key),))
+                    if not moved.empty:
+                        self._insert(conn, target, moved, version(target))
+                        self._delete(conn, source, moved.index, version(source))
+                    results.append(len(moved))
+                elif op[0] == 'delete':
+                    _, store, key_column, key = op
+                    rowids = [r[0] for r in conn.execute(
+                        f'SELECT _rowid FROM {_quote(STORES[store]["table"])} WHERE {_quote(key_column)} = ?',
+                        (_to_db_value(key),))]
+                    if rowids:
+                        self._delete(conn, store, rowids, version(store))
+                    results.append(len(rowids))
+                elif op[0] == 'prune':
+                    # rows dated before a cutoff, for retention
+                    _, store, column, before = op
+                    rowids = [r[0] for r in conn.execute(
+                        f'SELECT _rowid FROM {_quote(STORES[store]["table"])} WHERE {_quote(column)} < ?',
+                        (_to_db_value(pd.Timestamp(before)),))]
+                    if rowids:
+                        self._delete(conn, store, rowids, version(store))
+                    results.append(len(rowids))
+                else:
+                    raise ValueError(f'Unknown storage operation: {op[0]}')
+        return results
+
+    def replace(self, store, df):
+        self._prepare(store)
+        with self.transaction(write=True) as conn:
+            version = self._bump(conn, store, reset=True)
+            conn.execute(f'DELETE FROM {_quote(STORES[store]["table"])}')
+            if not df.empty:
+                self._insert(conn, store, df, version)
+
+    def allocate(self, name, count):
+        for store in EVENT_ID_STORES:
+            self._prepare(store)
+        with self.transaction(write=True) as conn:
+            return self._allocate(conn, name, count)
+
+    def _allocate(self, conn, name, count):
+        row = conn.execute('SELECT value FROM sequences WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            value = 0
+            for store in EVENT_ID_STORES:
+                ids = conn.execute(f'SELECT "event id" FROM {_quote(STORES[store]["table"])}')
+                value = max(value, max_event_number(r[0] for r in ids))
+            conn.execute('INSERT INTO sequences (name, value) VALUES (?, ?)', (name, value + count))
+        else:
+            value = row[0]
+            conn.execute('UPDATE sequences SET value = ? WHERE name = ?', (value + count, name))
+        return value + 1
+
+    def append_chunks(self, stores, chunks, assign_ids=False):
+        # a stream of (store, frame) pairs appended in one transaction with
+        # one version per store, so readers see all of it or none; chunks are
+        # inserted as they arrive. With assign_ids, rows without an 'event id'
+        # are numbered from the work-order sequence inside the same transaction
+        for name in set(EVENT_ID_STORES + list(stores)):
+            self._prepare(name)
+        total = 0
+        with self.transaction(write=True) as conn:
+            versions = {store: self._bump(conn, store) for store in stores}
+            for store, rows in chunks:
+                if assign_ids:
+                    missing = _missing_ids(rows)
+                    count = int(missing.sum())
+                    if count:
+                        rows['event id'] = rows['event id'].astype(object)
+                        rows.loc[missing, 'event id'] = _event_ids(self._allocate(conn, 'event_id', count), count)
+                if not rows.empty:
+                    self._insert(conn, store, rows, versions[store])
+                total += len(rows)
+        return total
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'excel': ExcelBackend,
+}
+
+_backend = None
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[os.environ.get('FACILITY_STORAGE', 'sqlite')]()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+    invalidate()
+
+
+def _file_stamp(store):
+    stamp = []
+    for path in get_backend().source_files(store):
+        try:
+            info = os.stat(path)
+            stamp.append((path, info.st_mtime_ns, info.st_size))
+        except FileNotFoundError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+def invalidate(store=None):
+    with _cache_lock:
+        for key in list(_cache):
+            if store is None or key[0] == store:
+                del _cache[key]
+
+
+def load_store(store, partition=None):
+    # uncached (df, version), for callers that keep their own copy
+    with metrics.span('load', store=store, partition=partition):
+        df, version = get_backend().read(store, partition)
+        schema.apply(df)
+    metrics.count('rows read', len(df))
+    return df, version
+
+
+def read_store_versioned(store, partition=None):
+    # a rerun over unchanged files costs a stat() per source file
+    stamp = _file_stamp(store)
+    key = (store, partition)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        metrics.count('load cache hits')
+        return cached[1].copy(), cached[2]
+    df, version = load_store(store, partition)
+    with _cache_lock:
+        # stamped before the read so a concurrent write forces a re-read
+        _cache[key] = (stamp, df, version)
+    return df.copy(), version
+
+
+def read_store(store, partition=None):
+    return read_store_versioned(store, partition)[0]
+
+
+def partitions(store):
+    return get_backend().partitions(store)
+
+
+def store_identity(store):
+    return get_backend().identity(store)
+
+
+def store_version(store):
+    return get_backend().version(store)
+
+
+def query(store, where=None, between=None, order_by=None, descending=False, limit=None, offset=0):
+    # uncached (df, total) of the rows matching where ({column: value or
+    # list of values}) and between ((date column, start, end), end
+    # exclusive), sorted by order_by; limit and offset select one page
+    with metrics.span('query', store=store):
+        df, total = get_backend().query(store, where, between, order_by, descending, limit, offset)
+        schema.apply(df)
+    metrics.count('rows read', len(df))
+    return df, total
+
+
+def changes(store, since):
+    # (version, rows, deleted row ids) written after `since`, or None when the
+    # store has to be read in full
+    with metrics.span('changes', store=store):
+        delta = get_backend().changes(store, since)
+        if delta is not None:
+            schema.apply(delta[1])
+    if delta is not None:
+        metrics.count('rows read', len(delta[1]))
+    return delta
+
+
+def refresh(store, df, since):
+    # bring a session copy up to date: unchanged stores cost one version
+    # lookup, otherwise only rows written after `since` are fetched.
+    # Returns (df, version, rows): rows is the fetched delta when it only
+    # added or changed rows, or None when rows were removed or df was
+    # reloaded in full
+    version = store_version(store)
+    if version == since:
+        return df, since, df.iloc[:0]
+    delta = changes(store, since)
+    if delta is None:
+        return load_store(store) + (None,)
+    version, rows, deleted = delta
+    kept = df.drop(index=rows.index.union(pd.Index(deleted, dtype='int64')).intersection(df.index))
+    return schema.concat([kept, rows]).sort_index(), version, None if deleted else rows
+
+
+def apply(ops):
+    # ops: ('append', store, rows), ('update', store, key_column, key, values),
+    # ('archive', source, target, key_column, key, values),
+    # ('delete', store, key_column, key) or ('prune', store, date_column,
+    # before). Appended rows are typed first, so
+    # 'N/A' ratings and blank dates are stored the same way everywhere
+    ops = [('append', op[1], schema.apply(op[2].copy())) if op[0] == 'append' else op for op in ops]
+    try:
+        with metrics.span('save', stores=_op_stores(ops), ops=len(ops)):
+            results = get_backend().apply(ops)
+        metrics.count('rows written', sum(results))
+        return results
+    finally:
+        for store in _op_stores(ops):
+            invalidate(store)
+
+
+def append_rows(store, rows):
+    if isinstance(rows, dict):
+        rows = pd.DataFrame([rows])
+    apply([('append', store, rows)])
+
+
+def replace_store(store, df):
+    try:
+        with metrics.span('save', stores=[store], ops=1):
+            get_backend().replace(store, df)
+        metrics.count('rows written', len(df))
+    finally:
+        invalidate(store)
+
+
+def next_event_ids(count=1):
+    return _event_ids(get_backend().allocate('event_id', count), count)
+
+
+def append_stream(stores, chunks, assign_ids=False):
+    # bulk load: (store, frame) pairs from a generator, typed and committed
+    # together; stores lists every store the pairs may name
+    try:
+        with metrics.span('import', stores=list(stores)):
+            added = get_backend().append_chunks(
+                stores, ((store, schema.apply(rows.copy())) for store, rows in chunks), assign_ids)
+        metrics.count('rows written', added)
+        return added
+    finally:
+        for store in stores:
+            invalidate(store)
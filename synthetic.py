@@ -0,0 +1,122 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import schema
+import storage
+from catalog import checklist_items, locations, repair_personnel
+
+
+DETECTORS = ['Wael Ayoub', 'Mona Adel', 'Omar Fathy', 'Heba Samir', 'Karim Nabil', 'Salma Hany']
+START = pd.Timestamp('2023-01-01')
+DAYS = 730
+# (element, checklist item) pairs; a finding's comment is the item it failed
+ITEMS = [(element, item) for element, items in checklist_items.items() for item in items]
+
+
+def _timestamps(rng, count, start=START, days=DAYS):
+    seconds = np.sort(rng.integers(0, days * 86400, count))
+    return start + pd.to_timedelta(seconds, unit='s') + pd.to_timedelta(rng.integers(0, 1000, count), unit='ms')
+
+
+def _choice(rng, values, count, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), count, p=p)]
+
+
+def _yes_no(rng, count, share):
+    return np.where(rng.random(count) < share, 'Yes', 'No').astype(object)
+
+
+def _days_after(rng, dates, low, high):
+    # date-only, as the Work Shop Order date pickers store them
+    dates = pd.DatetimeIndex(dates)
+    return (dates + pd.to_timedelta(rng.integers(low, high, len(dates)), unit='D')).normalize()
+
+
+def orders(rng, count, first_id=1):
+    # work orders raised over the period, oldest first, with a walk's mix of
+    # ratings and roughly two in three already given an expected repair date
+    dates = _timestamps(rng, count)
+    items = rng.integers(0, len(ITEMS), count)
+    expected = _days_after(rng, dates, 3, 30).to_series(index=range(count))
+    expected[rng.random(count) > 0.7] = pd.NaT
+    return pd.DataFrame({
+        'event id': [f'{storage.EVENT_ID_PREFIX}{n}' for n in range(first_id, first_id + count)],
+        'location': _choice(rng, locations, count),
+        'Element': np.array([ITEMS[i][0] for i in items], dtype=object),
+        'Event Detector Name': _choice(rng, DETECTORS, count),
+        'Date': dates,
+        'Rating': rng.choice([1, 2, 3], count, p=[0.5, 0.3, 0.2]),
+        'Rating N/A': False,
+        'responsible person': _choice(rng, repair_personnel, count),
+        'Expected repair Date': expected.to_numpy(),
+        'Actual Repair Date': pd.NaT,
+        'image path': '',
+        'comment': np.array([ITEMS[i][1] for i in items], dtype=object),
+        'Safety related': _yes_no(rng, count, 0.1),
+        'Quality related': _yes_no(rng, count, 0.15),
+    })
+
+
+def checks(rng, count):
+    # passed items of location walks: rating 0, or N/A where not applicable
+    na = rng.random(count) < 0.1
+    return pd.DataFrame({
+        'event id': 'check',
+        'location': _choice(rng, locations, count),
+        'Element': _choice(rng, list(checklist_items), count),
+        'Event Detector Name': _choice(rng, DETECTORS, count),
+        'Date': _timestamps(rng, count),
+        'Rating': np.where(na, 'N/A', '0').astype(object),
+        'comment': '',
+    })
+
+
+def history(rows, seed=0):
+    # `rows` rows in each store: open orders, completed orders, walk checks
+    # and the change log entries the completions and schedulings left
+    rng = np.random.default_rng(seed)
+    every = orders(rng, 2 * rows)
+    # older orders are more likely to be done
+    age = np.arange(2 * rows, 0, -1, dtype=float)
+    done = np.zeros(2 * rows, dtype=bool)
+    done[rng.choice(2 * rows, rows, replace=False, p=age / age.sum())] = True
+    completed = every[done].reset_index(drop=True)
+    completed['Actual Repair Date'] = _days_after(rng, completed['Date'], 1, 60)
+    completed['Status'] = 'Done'
+    open_orders = every[~done].reset_index(drop=True)
+
+    log_ids = pd.concat([completed['event id'], every.loc[every['Expected repair Date'].notna(), 'event id']])
+    log_ids = log_ids.sample(rows, replace=len(log_ids) < rows, random_state=seed).reset_index(drop=True)
+    new_dates = _days_after(rng, _timestamps(rng, rows), 1, 30)
+    change_log = pd.DataFrame({
+        'event id': log_ids,
+        'modifier name': _choice(rng, repair_personnel, rows),
+        'modification Date': _timestamps(rng, rows),
+        'modification type': _choice(rng, ['update Expected repair Date', 'update Actual Repair Date'], rows),
+        'new Date': new_dates.strftime('%Y-%m-%d'),
+    })
+    frames = {
+        'work_orders': open_orders,
+        'completed': completed,
+        'checklist': checks(rng, rows),
+        'change_log': change_log,
+    }
+    return {store: schema.apply(df) for store, df in frames.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic history as one CSV per store.')
+    parser.add_argument('rows', type=int, help='rows per store')
+    parser.add_argument('out', help='directory for the CSV files')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    os.makedirs(args.out, exist_ok=True)
+    for store, df in history(args.rows, args.seed).items():
+        df.to_csv(os.path.join(args.out, f'{store}.csv'), index=False)
+
+
+if __name__ == '__main__':
+    main()
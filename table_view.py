@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import metrics
+import schema
+
+
+FILTER_COLUMNS = ['location', 'Element', 'Rating', 'responsible person']
+PAGE_SIZE = 25
+# the Rating filter lists N/A beside the numbers; it selects the rows whose
+# Rating N/A flag is set, as their Rating itself is empty
+NA_OPTION = 'N/A'
+
+
+def filter_positions(df, selections, date_column=None, date_range=None):
+    # row positions matching every non-empty filter
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in selections.items():
+        if values and col in df.columns:
+            match = df[col].isin(values)
+            if col == 'Rating' and NA_OPTION in values and schema.RATING_NA in df.columns:
+                match |= df[schema.RATING_NA].fillna(False).astype(bool)
+            mask &= match.to_numpy()
+    if date_range and date_column in df.columns:
+        dates = pd.to_datetime(df[date_column], errors='coerce')
+        start = pd.Timestamp(date_range[0])
+        end = pd.Timestamp(date_range[-1]) + pd.Timedelta(days=1)
+        mask &= ((dates >= start) & (dates < end)).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def sort_positions(df, positions, column, descending=False):
+    values = df[column].iloc[positions].reset_index(drop=True)
+    if values.dtype == object:
+        # untyped columns holding numbers and text compare as text
+        values = values.where(values.isna(), values.astype(str))
+    order = values.sort_values(ascending=not descending, kind='stable', na_position='last').index.to_numpy()
+    return positions[order]
+
+
+def paged_table(df, key, filters=FILTER_COLUMNS, date_column='Date', page_size=PAGE_SIZE, image_column=None,
+                **dataframe_kwargs):
+    # filtering, sorting and paging happen here; only the visible page is
+    # sent to the browser
+    columns = [c for c in filters if c in df.columns]
+    has_dates = date_column in df.columns
+    selections = {}
+    date_range = None
+    with st.expander('Filter and sort'):
+        widget_cols = st.columns(len(columns) + has_dates or 1)
+        for widget_col, col in zip(widget_cols, columns):
+            options = sorted(df[col].dropna().unique().tolist(), key=str)
+            if col == 'Rating' and schema.RATING_NA in df.columns and df[schema.RATING_NA].fillna(False).any():
+                options.append(NA_OPTION)
+            selections[col] = widget_col.multiselect(col, options, key=f'{key}_filter_{col}')
+        if has_dates:
+            picked = widget_cols[-1].date_input(date_column, value=(), key=f'{key}_dates')
+            if picked:
+                date_range = picked
+        sort_col1, sort_col2 = st.columns([3, 1])
+        sort_by = sort_col1.selectbox('Sort by', ['(none)'] + [str(c) for c in df.columns], key=f'{key}_sort')
+        descending = sort_col2.checkbox('Descending', key=f'{key}_descending')
+
+    signature = (id(df), len(df), tuple((c, tuple(map(str, v))) for c, v in selections.items()),
+                 tuple(date_range or ()), sort_by, descending)
+    cached = st.session_state.get(f'{key}_positions')
+    if cached is not None and cached[0] == signature:
+        positions = cached[1]
+    else:
+        positions = filter_positions(df, selections, date_column, date_range)
+        if sort_by != '(none)':
+            positions = sort_positions(df, positions, sort_by, descending)
+        st.session_state[f'{key}_positions'] = (signature, positions)
+
+    total = len(positions)
+    pages = max(1, -(-total // page_size))
+    page = st.number_input('Page', min_value=1, value=1, step=1, key=f'{key}_page')
+    page = min(int(page), pages)
+    start = (page - 1) * page_size
+    end = min(start + page_size, total)
+    view = df.iloc[positions[start:end]]
+    if image_column in view.columns:
+        # thumbnails for the visible page only, served from the preview cache
+        import images
+
+        view = view.copy()
+        view.insert(0, 'preview', view[image_column].map(images.preview_data_uri))
+        dataframe_kwargs.setdefault('column_config', {})['preview'] = st.column_config.ImageColumn('preview')
+    with metrics.span('render', table=key, rows=len(view)):
+        st.dataframe(view, **dataframe_kwargs)
+    st.caption(f'Page {page} of {pages}: rows {start + 1 if total else 0}-{end} of {total}'
+               + (f' (filtered from {len(df)})' if total != len(df) else ''))
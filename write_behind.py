@@ -0,0 +1,157 @@
+import os
+import atexit
+import threading
+from collections import deque
+
+import pandas as pd
+
+import storage
+import images
+
+
+class Ticket:
+    # completion handle a session keeps for one queued job
+
+    def __init__(self, message):
+        self.message = message
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def finish(self, error=None):
+        self.error = error
+        self._done.set()
+
+
+class Job:
+    def __init__(self, kind, store, ticket, **payload):
+        self.kind = kind
+        self.store = store
+        self.ticket = ticket
+        self.payload = payload
+
+
+class WriteBehindQueue:
+    # one worker thread drains jobs in submission order; consecutive appends
+    # to the same store are committed as a single batch
+
+    def __init__(self, background=True):
+        self.background = background
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+
+    def _submit(self, job):
+        if not self.background:
+            self._run([job])
+            return job.ticket
+        with self._cond:
+            self._jobs.append(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name='write-behind', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return job.ticket
+
+    def append(self, store, rows, message=''):
+        if isinstance(rows, dict):
+            rows = pd.DataFrame([rows])
+        return self._submit(Job('append', store, Ticket(message), rows=rows))
+
+    def batch(self, ops, message='', uploads=()):
+        # storage.apply ops committed together in one transaction; uploads
+        # are stored first, and rows pointing at one that fails lose their
+        # 'image path'
+        return self._submit(Job('batch', None, Ticket(message), ops=ops, uploads=uploads))
+
+    def task(self, fn, message=''):
+        # housekeeping that reads and writes storage itself, run in order
+        # with the other jobs
+        return self._submit(Job('task', None, Ticket(message), fn=fn))
+
+    def image(self, data, rows=None, message=''):
+        # rows: frame of a later queued append whose 'image path' is cleared
+        # if the image cannot be stored
+        return self._submit(Job('image', None, Ticket(message), data=data, rows=rows))
+
+    def flush(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs and not self._busy, timeout)
+
+    def _next_batch(self):
+        job = self._jobs.popleft()
+        batch = [job]
+        while (job.kind == 'append' and self._jobs and self._jobs[0].kind == 'append'
+               and self._jobs[0].store == job.store):
+            batch.append(self._jobs.popleft())
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs)
+                batch = self._next_batch()
+                self._busy = True
+            try:
+                self._run(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _store_uploads(self, uploads, ops):
+        failed = []
+        for data in uploads:
+            try:
+                images.store_upload(data)
+            except Exception as e:
+                failed.append(str(e))
+                path = images.path_for_upload(data)
+                for op in ops:
+                    if op[0] == 'append' and 'image path' in op[2].columns:
+                        op[2].loc[op[2]['image path'] == path, 'image path'] = ''
+        return failed
+
+    def _run(self, batch):
+        job = batch[0]
+        try:
+            if job.kind == 'append':
+                rows = pd.concat([j.payload['rows'] for j in batch], ignore_index=True)
+                storage.append_rows(job.store, rows)
+            elif job.kind == 'batch':
+                failed = self._store_uploads(job.payload['uploads'], job.payload['ops'])
+                storage.apply(job.payload['ops'])
+                if failed:
+                    raise RuntimeError(f'{len(failed)} image(s) could not be saved: {failed[0]}')
+            elif job.kind == 'task':
+                job.payload['fn']()
+            elif job.kind == 'image':
+                try:
+                    images.store_upload(job.payload['data'])
+                except Exception:
+                    if job.payload['rows'] is not None:
+                        job.payload['rows']['image path'] = ''
+                    raise
+        except Exception as e:
+            for j in batch:
+                j.ticket.finish(str(e))
+        else:
+            for j in batch:
+                j.ticket.finish()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteBehindQueue(os.environ.get('FACILITY_WRITE_BEHIND', '1') != '0')
+            atexit.register(_queue.flush, 30)
+        return _queue